@@ -9,7 +9,7 @@ parser = RegexParser()
 
 bot = Bot(matcher=matcher, parser=parser, channel=channel)
 
-@bot.match('Execute the job ([a-zA-Z0-9_]+) in the project some/repository', {'PROJECT':'.*project ([a-zA-Z/]+).*', 'JOB':'.*job ([a-zA-Z0-9_]+).*'})
+@bot.match('Execute the job ([a-zA-Z0-9_]+) in the project some/repository', {'PROJECT':'project ([a-zA-Z/]+)', 'JOB':'job ([a-zA-Z0-9_]+)'})
 def check_pipeline(JOB, PROJECT):
     return f"Checking pipeline {JOB} for project {PROJECT}..."
 
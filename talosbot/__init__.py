@@ -4,4 +4,18 @@ from talosbot.logs import LoggingBuilder, DEFAULT_LOGGING_LEVEL
 
 # Generate and make available a logger at the init of this module
 log_level = getattr(logging, getenv('TALOS_LOG_LEVEL', '').upper(), DEFAULT_LOGGING_LEVEL)
-logger = LoggingBuilder(level=log_level, log_file=getenv('TALOS_LOG_FILE')).get_logger('TALOS')
+debug_rate_limit = getenv('TALOS_LOG_DEBUG_RATE')
+try:
+    debug_rate_limit = float(debug_rate_limit) if debug_rate_limit else None
+    malformed_debug_rate = False
+except ValueError:
+    debug_rate_limit = None
+    malformed_debug_rate = True
+logger = LoggingBuilder(level=log_level,
+                        log_file=getenv('TALOS_LOG_FILE'),
+                        use_queue=getenv('TALOS_LOG_QUEUE', '').lower() in ('1', 'true', 'yes'),
+                        json_format=getenv('TALOS_LOG_JSON', '').lower() in ('1', 'true', 'yes'),
+                        debug_rate_limit=debug_rate_limit).get_logger('TALOS')
+if malformed_debug_rate:
+    logger.warning('Ignoring the malformed TALOS_LOG_DEBUG_RATE %r, the debug logs are not rate limited',
+                   getenv('TALOS_LOG_DEBUG_RATE'))
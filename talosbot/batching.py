@@ -0,0 +1,156 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable
+
+
+class MicroBatcher(object):
+    '''
+    Collects the items submitted concurrently during a short window (or until the batch is full)
+    and resolves all of them with a single call to the batch function on a worker thread
+    '''
+
+    DEFAULT_MAX_BATCH_SIZE = 32
+    DEFAULT_MAX_WAIT = .005
+
+    def __init__(self,
+                 batch_function: Callable[[list], list],
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait: float = DEFAULT_MAX_WAIT,
+                 executor: Executor = None) -> None:
+        '''
+        The batch function gets a list of items and returns a list with one result per item,
+        a result being an exception instance is raised back to its caller
+        '''
+        self.batch_function = batch_function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # A single worker keeps the batches serialized, so the next one fills up meanwhile
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='talos-batcher')
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def submit(self, item):
+        '''
+        Queues the item into the current batch and waits for its result
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush(loop)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush, loop)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        '''
+        Closes the current batch and schedules its execution
+        '''
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = loop.create_task(self._run_batch(loop, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, batch: list) -> None:
+        '''
+        Executes the batch function in the executor and resolves every pending future
+        '''
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_function, items)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # The caller was cancelled meanwhile
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class PendingEncodings(object):
+    '''
+    Encode calls collected for the next model call, all of them with the same encode options
+    '''
+
+    def __init__(self, kwargs: dict) -> None:
+        self.kwargs = kwargs
+        self.calls = []
+        self.size = 0
+        self.full = threading.Event()
+
+
+class BatchingEncoder(object):
+    '''
+    Sentence encoder wrapper shared by many matchers, the encode calls made concurrently
+    from different threads during a short window are merged into a single model call.
+    Only the calls with the same encode options are merged. The first caller of a batch
+    waits for the window, unless nobody else is encoding or the batch is full, and runs it for everyone
+    '''
+
+    DEFAULT_MAX_BATCH_SIZE = 64
+    DEFAULT_MAX_WAIT = .002
+
+    def __init__(self, model, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait: float = DEFAULT_MAX_WAIT) -> None:
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # Batch being collected for every set of encode options
+        self._pending = {}
+        # Encode calls in progress, a lone caller doesn't wait for the window
+        self._callers = 0
+        self._lock = threading.Lock()
+        # A single batch runs at a time, the next one fills up meanwhile
+        self._model_lock = threading.Lock()
+
+    def encode(self, sentences: list, **kwargs):
+        future = Future()
+        key = repr(sorted(kwargs.items()))
+        with self._lock:
+            self._callers += 1
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = PendingEncodings(kwargs)
+            batch.calls.append((list(sentences), future))
+            batch.size += len(sentences)
+            if batch.size >= self.max_batch_size:
+                batch.full.set()
+            alone = self._callers == 1
+        try:
+            if leader:
+                if not alone:
+                    batch.full.wait(self.max_wait)
+                with self._lock:
+                    del self._pending[key]
+                self._run_batch(batch.calls, batch.kwargs)
+            return future.result()
+        finally:
+            with self._lock:
+                self._callers -= 1
+
+    def _run_batch(self, batch: list, kwargs: dict) -> None:
+        '''
+        Encodes every sentence of the batch at once and splits the embeddings back per caller
+        '''
+        # Imported here, the bots import the micro batcher from this module
+        import numpy as np
+        try:
+            with self._model_lock:
+                embeddings = np.asarray(self.model.encode([sentence for sentences, _ in batch for sentence in sentences], **kwargs))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for sentences, future in batch:
+            future.set_result(embeddings[start:start + len(sentences)])
+            start += len(sentences)
@@ -0,0 +1,68 @@
+import json
+import subprocess
+import sys
+
+# Modules that must not be imported as a side effect of importing each talosbot module
+HEAVY_MODULES = ('numpy', 'torch', 'sentence_transformers', 'sklearn', 'spacy', 'jsonschema', 'slack_bolt', 'telegram')
+# Heavy modules a checked module is built on, so it may import them
+ALLOWED_HEAVY_MODULES = {
+    'talosbot.matchers.bert': ('numpy',),
+}
+CHECKED_MODULES = (
+    'talosbot.talos',
+    'talosbot.cli.entrypoint',
+    'talosbot.matchers.regex',
+    'talosbot.matchers.bert',
+    'talosbot.parsers.regex',
+    'talosbot.parsers.ner',
+    'talosbot.channels.cli',
+    'talosbot.channels.slack',
+    'talosbot.channels.telegram',
+)
+# Default budget for the import of a single module, in seconds
+DEFAULT_MAX_IMPORT_TIME = .5
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy_modules": heavy}}))
+'''
+
+
+def measure(module: str) -> dict:
+    '''
+    Imports the module in a fresh interpreter and reports its import time
+    and the heavy modules it pulled in
+    '''
+    probe = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True)
+    if output.returncode != 0:
+        error = output.stderr.strip().splitlines()
+        return {'seconds': None, 'heavy_modules': [], 'error': error[-1] if error else 'unknown error'}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def run(max_import_time: float = DEFAULT_MAX_IMPORT_TIME) -> dict:
+    '''
+    Measures every checked module, the report is marked as failed when any of them
+    imports a heavy module or goes over the time budget
+    '''
+    report = {'max_import_time': max_import_time, 'modules': {}, 'passed': True}
+    for module in CHECKED_MODULES:
+        result = measure(module)
+        unexpected = set(result['heavy_modules']) - set(ALLOWED_HEAVY_MODULES.get(module, ()))
+        result['passed'] = ('error' not in result
+                            and not unexpected
+                            and result['seconds'] <= max_import_time)
+        report['modules'][module] = result
+        report['passed'] = report['passed'] and result['passed']
+    return report
+
+
+if __name__ == '__main__':
+    report = run()
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['passed'] else 1)
@@ -0,0 +1,244 @@
+import json
+import logging
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+COMPONENTS = ('regex_matcher', 'regex_parser', 'bert_matcher', 'ner_parser', 'bot')
+DEFAULT_COMPONENTS = ('regex_matcher', 'regex_parser', 'bot')
+DEFAULT_SKILL_COUNTS = (10, 100, 1000, 10000)
+DEFAULT_MESSAGES = 1000
+# Share of the generated messages that don't match any skill
+MISS_RATIO = .1
+PERCENTILES = (50, 95, 99)
+
+
+def generate_words(count: int, rng: random.Random) -> list:
+    '''
+    Unique pseudo words for the synthetic catalogues
+    '''
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 9))))
+    return sorted(words)
+
+
+def generate_catalogue(n_skills: int, seed: int = 0) -> list:
+    '''
+    Builds a synthetic skill catalogue, every skill has a command and a target word,
+    plus a free ARG parameter
+    '''
+    rng = random.Random(seed)
+    words = generate_words(2 * n_skills, rng)
+    rng.shuffle(words)
+    catalogue = []
+    for ith in range(n_skills):
+        command, target = words[2 * ith], words[2 * ith + 1]
+        catalogue.append({
+            'name': f'skill_{ith}',
+            'command': command,
+            'target': target,
+            'regex': rf'{command} the {target} (\w+)',
+            'sentence': f'{command} the {target} now',
+            'extraction': {'ARG': rf'{target} (\w+)'},
+            'entities': ('ARG',),
+        })
+    return catalogue
+
+
+def generate_messages(catalogue: list, n_messages: int, seed: int = 0) -> list:
+    '''
+    Builds a synthetic message corpus for the catalogue, with a share of misses
+    '''
+    rng = random.Random(seed + 1)
+    messages = []
+    for ith in range(n_messages):
+        if rng.random() < MISS_RATIO:
+            messages.append(f'unknown request number {ith}')
+        else:
+            skill = rng.choice(catalogue)
+            messages.append(f"{skill['command']} the {skill['target']} item{ith}")
+    return messages
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    '''
+    Throughput and latency percentiles, in milliseconds, of the measured calls
+    '''
+    latencies = sorted(latencies)
+    summary = {
+        'calls': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else None,
+        'mean_ms': 1000 * sum(latencies) / len(latencies) if latencies else None,
+    }
+    for percentile in PERCENTILES:
+        rank = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        summary[f'p{percentile}_ms'] = 1000 * latencies[rank] if latencies else None
+    return summary
+
+
+def measure(function, items: list) -> dict:
+    '''
+    Calls the function with every item and summarizes the latencies, exceptions count as calls
+    '''
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for item in items:
+        call_start = time.perf_counter()
+        try:
+            function(item)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - call_start)
+    summary = summarize(latencies, time.perf_counter() - start)
+    summary['errors'] = errors
+    return summary
+
+
+def peak_rss_mb() -> float | None:
+    '''
+    Peak resident memory of the process, None where the resource module is missing (Windows)
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def build_matcher(component: str, catalogue: list, options: dict):
+    if component == 'bert_matcher' or options.get('matcher') == 'bert':
+        from talosbot.matchers.bert import BertMatcher
+        matcher = BertMatcher(**({'model': options['bert_model']} if options.get('bert_model') else {}))
+        # The entities for the NER parser, otherwise the regex parser extraction patterns
+        patterns_key = 'entities' if options.get('ner_model') else 'extraction'
+        for skill in catalogue:
+            matcher.match(skill['sentence'], skill[patterns_key])(lambda **kwargs: 'done')
+        matcher.build_index()
+        return matcher
+    from talosbot.matchers.regex import RegexMatcher
+    matcher = RegexMatcher()
+    for skill in catalogue:
+        matcher.match(skill['regex'], skill['extraction'])(lambda **kwargs: 'done')
+    matcher.build_engine()
+    return matcher
+
+
+def run_case(component: str, n_skills: int, n_messages: int, options: dict) -> dict:
+    '''
+    Benchmarks a single component with a catalogue size, meant to run in its own process
+    so the peak RSS belongs to that case only
+    '''
+    from talosbot import logger
+    # Misses log a warning each, keep the terminal output out of the measures
+    logger.setLevel(logging.ERROR)
+    catalogue = generate_catalogue(n_skills, options.get('seed', 0))
+    messages = generate_messages(catalogue, n_messages, options.get('seed', 0))
+    setup_start = time.perf_counter()
+    if component in ('regex_matcher', 'bert_matcher'):
+        matcher = build_matcher(component, catalogue, options)
+        setup = time.perf_counter() - setup_start
+        result = measure(matcher.sentence_matcher, messages)
+    elif component == 'regex_parser':
+        from talosbot.parsers.regex import RegexParser
+        parser = RegexParser()
+        skills = {skill['command']: skill for skill in catalogue}
+        cases = [(message, skills.get(message.split(' ')[0], catalogue[0])['extraction']) for message in messages]
+        setup = time.perf_counter() - setup_start
+        result = measure(lambda case: parser.extract_parameters(case[0], case[1]), cases)
+    elif component == 'ner_parser':
+        from talosbot.parsers.ner import NERParser
+        if not options.get('ner_model'):
+            raise ValueError('The ner_parser benchmark requires a NER model path')
+        parser = NERParser(options['ner_model'], cache_size=0)
+        setup = time.perf_counter() - setup_start
+        result = measure(lambda message: parser.extract_parameters(message, ('ARG',), all_required=False), messages)
+    elif component == 'bot':
+        from talosbot.channels.memory import MemoryChannel
+        from talosbot.metrics import Metrics
+        from talosbot.parsers.regex import RegexParser
+        from talosbot.talos import Bot
+        matcher = build_matcher(component, catalogue, options)
+        if options.get('matcher') == 'bert':
+            from talosbot.parsers.ner import NERParser
+            parser = NERParser(options['ner_model']) if options.get('ner_model') else RegexParser()
+        else:
+            parser = RegexParser()
+        channel = MemoryChannel(messages)
+        metrics = Metrics()
+        bot = Bot(matcher=matcher, parser=parser, channel=channel, metrics=metrics)
+        setup = time.perf_counter() - setup_start
+        # Drive the channel loop one message at a time to time each of them
+        result = measure(lambda _: channel.process_next(), messages)
+        result['stages'] = metrics.snapshot()['stages']
+    else:
+        raise ValueError(f'Unknown component {component}')
+    result.update({
+        'component': component,
+        'skills': n_skills,
+        'messages': n_messages,
+        'setup_seconds': setup,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    return result
+
+
+def run(components: tuple = DEFAULT_COMPONENTS,
+        skill_counts: tuple = DEFAULT_SKILL_COUNTS,
+        n_messages: int = DEFAULT_MESSAGES,
+        options: dict = None) -> dict:
+    '''
+    Runs every component and catalogue size, each case in a fresh process
+    '''
+    options = options or {}
+    report = {
+        'talosbot': talosbot_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'messages': n_messages,
+        'results': [],
+    }
+    for component in components:
+        for n_skills in skill_counts:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                try:
+                    result = executor.submit(run_case, component, n_skills, n_messages, options).result()
+                except Exception as e:
+                    result = {'component': component, 'skills': n_skills, 'error': f'{type(e).__name__}: {e}'}
+            report['results'].append(result)
+    return report
+
+
+def talosbot_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return version('talosbot')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def format_report(report: dict) -> str:
+    '''
+    Human readable table of the benchmark report
+    '''
+    lines = [f"talosbot {report['talosbot']} - python {report['python']} - {report['messages']} messages",
+             f"{'component':<14}{'skills':>8}{'msg/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>10}"]
+    for result in report['results']:
+        if 'error' in result:
+            lines.append(f"{result['component']:<14}{result['skills']:>8}  {result['error']}")
+            continue
+        peak_rss = '-' if result['peak_rss_mb'] is None else f"{result['peak_rss_mb']:.1f}"
+        lines.append(f"{result['component']:<14}{result['skills']:>8}{result['throughput']:>12.1f}"
+                     f"{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+                     f"{peak_rss:>10}")
+    return '\n'.join(lines)
+
+
+def write_report(report: dict, path: str) -> None:
+    with open(path, 'w') as json_file:
+        json.dump(report, json_file, indent=2, sort_keys=True)
@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    '''
+    Thread safe, size bounded, least recently used cache,
+    the values expire ttl seconds after they were put when a ttl is given
+    '''
+
+    def __init__(self, max_size: int = 1024, ttl: float = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached value (refreshing its recency) or the default one
+        '''
+        with self._lock:
+            if key not in self._items:
+                return default
+            value, expires_at = self._items[key]
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        '''
+        Caches the value, evicting the least recently used one when the cache is full
+        '''
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        '''
+        Removes every cached value
+        '''
+        with self._lock:
+            self._items.clear()
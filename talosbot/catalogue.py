@@ -0,0 +1,135 @@
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+from talosbot import logger
+
+
+class SkillCatalogue(object):
+    '''
+    Declarative skills catalogue, hot reloaded into the bot. It's either a json file:
+    {"skills": [{"sentence": ..., "skill": "package.module:function", "patterns": {...}}]}
+    or a python module with a SKILLS list of the same dicts, where the skill is the function itself.
+    Any other key of a skill is passed to the matcher (e.g. the hybrid matcher regex).
+    A polling thread watches the file, and the modules of the json skills, and swaps
+    the new skills in whenever they change
+    '''
+
+    DEFAULT_INTERVAL = 2.
+
+    def __init__(self, bot, path: str, interval: float = DEFAULT_INTERVAL) -> None:
+        self.bot = bot
+        self.path = Path(path)
+        self.interval = interval
+        self.skills = {}
+        # Modification time of the modules of the json skills, by module name
+        self._modules = {}
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def import_skill(self, path: str):
+        '''
+        Imports the skill function from its "package.module:function" path,
+        the module is reloaded when its file changed since it was imported
+        '''
+        module_name, _, function_name = path.partition(':')
+        module = importlib.import_module(module_name)
+        module_path = getattr(module, '__file__', None)
+        if module_path is not None:
+            modified = os.stat(module_path).st_mtime_ns
+            previous, self._modules[module_name] = self._modules.get(module_name, modified), modified
+            if previous != modified:
+                module = importlib.reload(module)
+        return getattr(module, function_name)
+
+    def signature(self) -> tuple:
+        '''
+        Current modification state of the catalogue and of the modules of its json skills
+        '''
+        stat = self.path.stat()
+        modules = {name: os.stat(sys.modules[name].__file__).st_mtime_ns for name in self._modules if name in sys.modules}
+        return (stat.st_mtime_ns, stat.st_size), modules
+
+    @staticmethod
+    def skill_identity(skill: dict) -> tuple:
+        '''
+        Comparable form of a skill, a function defined again with the same code is the same skill
+        '''
+        func = skill['func']
+        code = getattr(func, '__code__', func)
+        return code, tuple(sorted((key, repr(value)) for key, value in skill.items() if key != 'func'))
+
+    def load_skills(self) -> dict:
+        '''
+        Reads the catalogue and returns its skills by sentence
+        '''
+        if self.path.suffix == '.py':
+            # Executed again on every load, so the changes of its functions are loaded too
+            spec = importlib.util.spec_from_file_location(f'talosbot_catalogue_{self.path.stem}', self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            entries = module.SKILLS
+        else:
+            with open(self.path, 'r') as catalogue_file:
+                entries = json.load(catalogue_file)['skills']
+        skills = {}
+        for entry in entries:
+            entry = dict(entry)
+            sentence = entry.pop('sentence')
+            func = entry.pop('skill')
+            skills[sentence] = dict(entry, func=self.import_skill(func) if isinstance(func, str) else func)
+        return skills
+
+    def reload(self) -> bool:
+        '''
+        Loads the catalogue and swaps its skills into the bot when any of them changed
+        '''
+        # Taken first, a broken catalogue is not loaded again until it changes
+        self._signature = self.signature()
+        skills = self.load_skills()
+        # The modules as they were imported, a module changed meanwhile is loaded again
+        self._signature = self._signature[0], dict(self._modules)
+        added = [sentence for sentence in skills if sentence not in self.skills]
+        removed = [sentence for sentence in self.skills if sentence not in skills]
+        changed = [sentence for sentence in skills if sentence in self.skills
+                   and self.skill_identity(skills[sentence]) != self.skill_identity(self.skills[sentence])]
+        if not (added or removed or changed):
+            return False
+        # The skills registered with the decorators meanwhile are kept along the catalogue ones
+        base_skills = {sentence: skill for sentence, skill in self.bot.matcher.available_skills.items()
+                       if sentence not in self.skills}
+        self.bot.reload_skills({**base_skills, **skills})
+        self.skills = skills
+        logger.info('Reloaded skills catalogue %s: %d added, %d changed, %d removed',
+                    self.path, len(added), len(changed), len(removed))
+        return True
+
+    def watch(self) -> None:
+        '''
+        Polls the catalogue file, reloading it on every change
+        '''
+        while not self._stop.wait(self.interval):
+            try:
+                if self.signature() != self._signature:
+                    self.reload()
+            except Exception:
+                logger.exception('Cannot reload the skills catalogue %s, keeping the previous skills', self.path)
+
+    def start(self) -> None:
+        '''
+        Loads the catalogue and starts watching it
+        '''
+        self.reload()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.watch, name='talos-catalogue', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
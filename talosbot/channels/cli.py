@@ -25,4 +25,5 @@ class CLIChannel(AbstractChannel):
         while True:
             message = self.receive_message()
             response_message = self.bot.message_handler(message)
-            self.dispatch_message(response_message)
+            with self.bot.metrics.timer('dispatch'):
+                self.dispatch_message(response_message)
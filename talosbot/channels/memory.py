@@ -0,0 +1,40 @@
+from collections import deque
+from talosbot.channels.abstract_channel import AbstractChannel
+from talosbot.talos import Message
+
+
+class MemoryChannel(AbstractChannel):
+    ''' In-memory channel, it processes a list of messages and keeps the responses (testing and benchmarks) '''
+
+    def __init__(self, messages: list = None) -> None:
+        super().__init__()
+        self.messages = deque(messages or [])
+        self.responses = []
+
+    def receive_message(self) -> Message:
+        '''
+        Returns the next pending message
+        '''
+        return Message(self.messages.popleft())
+
+    def dispatch_message(self, message: Message) -> None:
+        '''
+        Keeps the response message
+        '''
+        self.responses.append(message.message)
+
+    def process_next(self) -> None:
+        '''
+        Passes the next pending message through the bot and dispatches its response
+        '''
+        message = self.receive_message()
+        response_message = self.bot.message_handler(message)
+        with self.bot.metrics.timer('dispatch'):
+            self.dispatch_message(response_message)
+
+    def establish(self) -> None:
+        '''
+        Processes every pending message until the list is empty
+        '''
+        while self.messages:
+            self.process_next()
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime
+from talosbot.benchmarks.suite import summarize
+from talosbot.channels.abstract_channel import AbstractChannel
+from talosbot.talos import Message
+from talosbot import logger
+
+
+class ReplayChannel(AbstractChannel):
+    '''
+    Load testing channel, it replays a recorded message log (jsonl lines with a timestamp and a message)
+    through the bot async message handler and records the latency and outcome of every message.
+    The messages are sent at the recorded pace (divided by speed), or open-loop at a fixed qps,
+    without waiting for the previous responses, so the latency is measured from the scheduled
+    send time and includes any queueing
+    '''
+
+    DEFAULT_CONCURRENCY = 16
+
+    def __init__(self, log_path: str, results_path: str = None,
+                 speed: float = 1.,
+                 qps: float = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 timestamp_field: str = 'timestamp',
+                 message_field: str = 'message') -> None:
+        super().__init__()
+        self.log_path = log_path
+        self.results_path = results_path
+        self.speed = speed
+        self.qps = qps
+        self.concurrency = concurrency
+        self.timestamp_field = timestamp_field
+        self.message_field = message_field
+        self.summary = None
+        self._records = None
+        self._results_file = None
+        self._latencies = []
+        self._outcomes = Counter()
+
+    @staticmethod
+    def parse_timestamp(timestamp) -> float:
+        '''
+        Seconds of an epoch number or an ISO 8601 string timestamp
+        '''
+        if isinstance(timestamp, str):
+            return datetime.fromisoformat(timestamp).timestamp()
+        return float(timestamp)
+
+    def read_log(self):
+        '''
+        Streams the messages of the log with their send offset from the replay start
+        '''
+        first_timestamp = None
+        with open(self.log_path, 'r') as log_file:
+            for index, line in enumerate(log for log in log_file if log.strip()):
+                record = json.loads(line)
+                if self.qps:
+                    offset = index / self.qps
+                else:
+                    timestamp = self.parse_timestamp(record[self.timestamp_field])
+                    first_timestamp = timestamp if first_timestamp is None else first_timestamp
+                    offset = max(.0, timestamp - first_timestamp) / self.speed
+                yield Message(record[self.message_field], {'index': index, 'offset': offset, 'record': record})
+
+    def receive_message(self) -> Message:
+        '''
+        Returns the next message of the log, None once the log is over
+        '''
+        if self._records is None:
+            self._records = self.read_log()
+        return next(self._records, None)
+
+    def dispatch_message(self, message: Message) -> None:
+        '''
+        Records the response, with its latency and outcome, into the results file
+        '''
+        meta = message.meta
+        self._latencies.append(meta['latency'])
+        self._outcomes[meta['outcome']] += 1
+        if self._results_file is not None:
+            result = {
+                'index': meta['index'],
+                'message': meta['record'][self.message_field],
+                'response': message.message,
+                'outcome': meta['outcome'],
+                'latency_ms': 1000 * meta['latency'],
+                'service_time_ms': 1000 * meta['service_time'],
+            }
+            self._results_file.write(json.dumps(result) + '\n')
+
+    async def replay_message(self, message: Message, scheduled: float, semaphore: asyncio.Semaphore) -> None:
+        '''
+        Passes the message through the bot and dispatches the measured response
+        '''
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            started = loop.time()
+            try:
+                response_message = await self.bot.async_message_handler(message)
+                outcome = 'timeout' if response_message.timed_out else 'ok'
+            except Exception as e:
+                logger.exception('Error replaying message: %s', message.message)
+                response_message = Message(repr(e), message.meta)
+                outcome = 'error'
+        finished = loop.time()
+        response_message.meta = dict(message.meta, outcome=outcome,
+                                     latency=finished - scheduled, service_time=finished - started)
+        with self.bot.metrics.timer('dispatch'):
+            self.dispatch_message(response_message)
+
+    async def replay(self) -> dict:
+        '''
+        Replays the whole log and returns the summary of the run
+        '''
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self._latencies = []
+        self._outcomes = Counter()
+        self._records = None
+        tasks = []
+        self._results_file = open(self.results_path, 'w') if self.results_path else None
+        try:
+            start = loop.time()
+            message = self.receive_message()
+            while message is not None:
+                scheduled = start + message.meta['offset']
+                delay = scheduled - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.replay_message(message, scheduled, semaphore)))
+                message = self.receive_message()
+            await asyncio.gather(*tasks)
+            elapsed = loop.time() - start
+        finally:
+            if self._results_file is not None:
+                self._results_file.close()
+                self._results_file = None
+        self.summary = dict(summarize(self._latencies, elapsed), outcomes=dict(self._outcomes))
+        logger.info('Replay summary: %s', self.summary)
+        return self.summary
+
+    def establish(self) -> None:
+        '''
+        Replays the log until its end
+        '''
+        asyncio.run(self.replay())
@@ -1,18 +1,32 @@
 from talosbot.channels.abstract_channel import AbstractChannel
 from talosbot.talos import Message
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
+from talosbot.workers import FairWorkerPool
 
 
 # Please, note channel here is a talosbot connector to slack,
 # not a slack channel by itself
 class SlackChannel(AbstractChannel):
-    ''' Channel for Slack (TalosBot connector) '''
-    def __init__(self, app_token: str, bot_token: str, trigger_word: str='/talos') -> None:
+    '''
+    Channel for Slack (TalosBot connector), the slash commands are acknowledged right away
+    and processed by a pool of workers taking turns between users, responding as they complete
+    '''
+
+    DEFAULT_BUSY_MESSAGE = 'Sorry, I am too busy right now, try it again later'
+
+    def __init__(self, app_token: str, bot_token: str, trigger_word: str='/talos',
+                 workers: int = None,
+                 max_pending: int = FairWorkerPool.DEFAULT_MAX_PENDING,
+                 max_pending_per_user: int = FairWorkerPool.DEFAULT_MAX_PENDING_PER_KEY,
+                 busy_message: str = DEFAULT_BUSY_MESSAGE) -> None:
         super().__init__()
         self.app_token = app_token
         self.bot_token = bot_token
         self.trigger_word = trigger_word if trigger_word.startswith('/') else f'/{trigger_word}'
+        self.busy_message = busy_message
+        # Workers default to the cpu count, the model inference releases the GIL
+        self.pool = FairWorkerPool(workers, max_pending, max_pending_per_user, name='talos-slack')
+        # Imported here so importing the channel module stays cheap
+        from slack_bolt import App
         self.app = App(token=bot_token)
         self._build_slack_handler()
 
@@ -22,13 +36,25 @@ class SlackChannel(AbstractChannel):
         '''
         @self.app.command(self.trigger_word)
         def handle_message(ack, respond, command: dict) -> None:
+            # Acknowledged before any processing, within the slack 3 seconds window
             ack()
             user_message = command['text']
             message = Message(user_message)
-            response_message = self.bot.message_handler(message)
+            if not self.pool.submit(command.get('user_id'), self.process_message, message, respond):
+                self.bot.metrics.increment('rejected')
+                respond(self.busy_message)
+
+    def process_message(self, message: Message, respond) -> None:
+        '''
+        Runs the bot pipeline in a worker and responds with the result
+        '''
+        response_message = self.bot.message_handler(message)
+        with self.bot.metrics.timer('dispatch'):
             respond(response_message.message)
 
     def establish(self) -> None:
+        from slack_bolt.adapter.socket_mode import SocketModeHandler
+        self.pool.start()
         SocketModeHandler(self.app, self.app_token).start()
 
     def receive_message(self) -> Message:
@@ -1,18 +1,43 @@
+import asyncio
+from typing import TYPE_CHECKING
+from talosbot import logger
 from talosbot.channels.abstract_channel import AbstractChannel
 from talosbot.talos import Message
-from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 
 class TelegramChannel(AbstractChannel):
-    ''' Channel for Telegram '''
+    '''
+    Channel for Telegram, with opt-in concurrent updates. The messages of every chat are
+    processed in order, and the burst queued meanwhile is resolved in a single batch,
+    which requires the concurrent updates (otherwise no update arrives meanwhile).
+    A failing batch is answered with the default skill and the chat keeps draining
+    '''
+
+    DEFAULT_MAX_BATCH_SIZE = 16
 
-    def __init__(self, token, restricted=False, white_list=[], trigger_word='talos') -> None:
+    def __init__(self, token, restricted=False, white_list=[], trigger_word='talos',
+                 concurrent_updates: int = None,
+                 batch_window: float = .0,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE) -> None:
         super().__init__()
         self.token = token
         self.restricted = restricted
-        self.white_list = white_list
-        self.app = ApplicationBuilder().token(self.token).build()
+        self.white_list = set(white_list)
+        # Extra time waited for a burst to build up before processing a chat queue
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        # Messages waiting per chat, a chat is here while one of its updates is processing them
+        self._chats = {}
+        # Imported here so importing the channel module stays cheap
+        from telegram.ext import ApplicationBuilder, CommandHandler
+        builder = ApplicationBuilder().token(self.token)
+        if concurrent_updates:
+            builder = builder.concurrent_updates(concurrent_updates)
+        self.app = builder.build()
         self.app.add_handler(CommandHandler(trigger_word, self.receive_message))
 
     def establish(self):
@@ -21,22 +46,62 @@ class TelegramChannel(AbstractChannel):
         '''
         self.app.run_polling()
 
-    async def receive_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Message:
+    async def receive_message(self, update: 'Update', context: 'ContextTypes.DEFAULT_TYPE') -> Message:
         '''
-        When a message is received, the message handler is called,
-        then sends the response with the dispatch method
+        When a message is received, it's queued into its chat, the update finding the chat idle
+        calls the message handler with the queued messages and sends the responses with the dispatch method
         '''
         user_message = ' '.join(context.args).strip()
         meta = {
             'update': update,
             'context': context,
         }
-        if not self.restricted or update.effective_user.id in self.white_list:
-            message = Message(user_message, meta)
-            response_message = await self.bot.async_message_handler(message)
-        else:
+        if self.restricted and update.effective_user.id not in self.white_list:
             response_message = Message(f'Access denied for user with ID {update.effective_user.id}', meta=meta)
-        await self.dispatch_message(response_message)
+            with self.bot.metrics.timer('dispatch'):
+                await self.dispatch_message(response_message)
+            return
+        chat_id = update.effective_chat.id
+        queue = self._chats.get(chat_id)
+        if queue is not None:
+            # Already being processed, the message joins the next batch of the chat
+            queue.append(Message(user_message, meta))
+            return
+        queue = self._chats[chat_id] = [Message(user_message, meta)]
+        try:
+            while queue:
+                if self.batch_window:
+                    await asyncio.sleep(self.batch_window)
+                batch = queue[:self.max_batch_size]
+                del queue[:self.max_batch_size]
+                try:
+                    if len(batch) == 1:
+                        response_messages = [await self.bot.async_message_handler(batch[0])]
+                    else:
+                        response_messages = await self.bot.async_message_handler_many(batch)
+                except Exception:
+                    logger.exception('Error processing %d messages of chat %s', len(batch), chat_id)
+                    response_messages = await self.default_responses(batch)
+                with self.bot.metrics.timer('dispatch'):
+                    for response_message in response_messages:
+                        try:
+                            await self.dispatch_message(response_message)
+                        except Exception:
+                            logger.exception('Error sending a response to chat %s', chat_id)
+        finally:
+            del self._chats[chat_id]
+
+    async def default_responses(self, batch: list) -> list[Message]:
+        '''
+        Answers every message of a failed batch with the default response of the bot
+        '''
+        responses = []
+        for user_message in batch:
+            try:
+                responses.append(await self.bot.default_response(user_message))
+            except Exception:
+                logger.exception('Error running the default skill')
+        return responses
     
     async def dispatch_message(self, message: Message) -> None:
         '''
@@ -1,5 +1,5 @@
 import argparse
-from talosbot.parsers.ner import NERTrainer
+from talosbot.server import DEFAULT_ADDRESS
 
 class TalosCLI(object):
     ''' Talos CLI '''
@@ -11,8 +11,33 @@ class TalosCLI(object):
         raise TypeError('Cannot instansiate this static class')
     
     @classmethod
-    def ner_trainer(cls, training_set: str, output: str, model: str = None) -> None:
-        NERTrainer.run(training_set, output, model)
+    def ner_trainer(cls, training_set: str, output: str, model: str = None, **training_options) -> None:
+        # Heavy modules are imported by the subcommands that need them, so the CLI starts fast
+        from talosbot.parsers.ner import NERTrainer
+        NERTrainer.run(training_set, output, model, **training_options)
+
+    @classmethod
+    def convert(cls, training_set: str, output: str) -> None:
+        from talosbot.parsers.ner import NERTrainer
+        NERTrainer.convert(training_set, output).close()
+
+    @classmethod
+    def export(cls, model: str, output: str, keep_vectors: bool = None) -> None:
+        from talosbot.parsers.ner import NERTrainer
+        NERTrainer.export_model(model, output, keep_vectors)
+
+    @classmethod
+    def model_server(cls, matcher_model: str, parser_model: str, address: str) -> None:
+        from talosbot.server import ModelServer
+        ModelServer(matcher_model, parser_model, address).serve_forever()
+
+    @classmethod
+    def bench(cls, components: list, skills: list, messages: int, output: str = None, **options) -> None:
+        from talosbot.benchmarks.suite import format_report, run, write_report
+        report = run(components, skills, messages, options)
+        print(format_report(report))
+        if output:
+            write_report(report, output)
 
     @classmethod
     def run(cls) -> None:
@@ -24,11 +49,75 @@ class TalosCLI(object):
 
         # Command for 'nertrainer'
         parser_trainer = subparsers.add_parser('trainer', help='Train the NER model')
-        parser_trainer.add_argument('--trainingset', metavar='TRAINING_SET', required=True, help='Training set file')
+        parser_trainer.add_argument('--trainingset', metavar='TRAINING_SET', required=True, help='Training set file (json, jsonl, spacy DocBin or converted corpus)')
         parser_trainer.add_argument('--output', metavar='DIR', required=True, help='Output empty dir for the generated model')
         parser_trainer.add_argument('--model', metavar='NAME', required=False, help='Model name to use instead creating a blank new one')
+        parser_trainer.add_argument('--epochs', metavar='N', type=int, default=100, help='Training epochs (default: 100)')
+        parser_trainer.add_argument('--dropout', metavar='RATE', type=float, default=.5, help='Dropout rate (default: 0.5)')
+        parser_trainer.add_argument('--batch-size', metavar='N', type=int, default=32, help='Maximum size of the compounding minibatches (default: 32)')
+        parser_trainer.add_argument('--eval-split', metavar='SHARE', type=float, default=.0, help='Share of the training set held out for evaluation (default: 0)')
+        parser_trainer.add_argument('--patience', metavar='N', type=int, required=False, help='Stop after N epochs without improving the evaluation F-score')
+        parser_trainer.add_argument('--n-process', metavar='N', type=int, default=1, help='Processes used to prepare the training examples (default: 1)')
+        parser_trainer.add_argument('--checkpoint-every', metavar='N', type=int, default=None, help='Epochs between checkpoints in the output dir (default: no checkpoints, every epoch with --resume)')
+        parser_trainer.add_argument('--resume', action='store_true', help='Resume the training from the checkpoint in the output dir')
+        parser_trainer.add_argument('--fine-tune', action='store_true', help='Update the trained --model with the new training set instead of initializing it')
+        parser_trainer.add_argument('--rehearsal-set', metavar='TRAINING_SET', required=False, help='Old training set sampled every epoch while fine tuning')
+        parser_trainer.add_argument('--rehearsal-ratio', metavar='RATIO', type=float, default=1., help='Old examples rehearsed per new example (default: 1)')
+        parser_trainer.add_argument('--seed', metavar='N', type=int, required=False, help='Seed of the evaluation split and the shuffling')
+        parser_trainer.add_argument('--export', metavar='DIR', required=False, help='Also export the slim inference model into DIR')
+
+        # Command for 'convert'
+        parser_convert = subparsers.add_parser('convert', help='Convert a training set into a memory-mapped binary corpus')
+        parser_convert.add_argument('--trainingset', metavar='TRAINING_SET', required=True, help='Training set file (json, jsonl or spacy DocBin)')
+        parser_convert.add_argument('--output', metavar='PATH', required=True, help='Output corpus path, passed as --trainingset to the trainer')
+
+        # Command for 'export'
+        parser_export = subparsers.add_parser('export', help='Export a trained model keeping only what the NER parser needs')
+        parser_export.add_argument('--model', metavar='PATH', required=True, help='Trained spaCy model')
+        parser_export.add_argument('--output', metavar='DIR', required=True, help='Output dir for the exported model')
+        parser_export.add_argument('--keep-vectors', action='store_true', default=None, help='Keep the word vectors even when no kept pipe uses them')
+
+        # Command for 'serve'
+        parser_server = subparsers.add_parser('serve', help='Serve the models to the bot workers of this host')
+        parser_server.add_argument('--matcher-model', metavar='NAME', required=False, help='Sentence transformer model for the BERT matcher')
+        parser_server.add_argument('--parser-model', metavar='PATH', required=False, help='spaCy model for the NER parser')
+        parser_server.add_argument('--address', metavar='SOCKET', default=DEFAULT_ADDRESS, help='Unix socket to listen on')
+
+        # Command for 'bench'
+        from talosbot.benchmarks.suite import COMPONENTS, DEFAULT_COMPONENTS, DEFAULT_MESSAGES, DEFAULT_SKILL_COUNTS
+        parser_bench = subparsers.add_parser('bench', help='Benchmark the matchers, parsers and the bot loop')
+        parser_bench.add_argument('--components', metavar='NAME', nargs='+', choices=COMPONENTS, default=list(DEFAULT_COMPONENTS), help='Components to benchmark')
+        parser_bench.add_argument('--skills', metavar='N', nargs='+', type=int, default=list(DEFAULT_SKILL_COUNTS), help='Synthetic catalogue sizes')
+        parser_bench.add_argument('--messages', metavar='N', type=int, default=DEFAULT_MESSAGES, help='Messages per benchmark case')
+        parser_bench.add_argument('--matcher', choices=('regex', 'bert'), default='regex', help='Matcher used by the bot benchmark')
+        parser_bench.add_argument('--bert-model', metavar='NAME', required=False, help='Sentence transformer model for the BERT matcher')
+        parser_bench.add_argument('--ner-model', metavar='PATH', required=False, help='spaCy model for the NER parser')
+        parser_bench.add_argument('--seed', metavar='N', type=int, default=0, help='Seed of the synthetic catalogues and messages')
+        parser_bench.add_argument('--output', metavar='FILE', required=False, help='JSON report output file')
 
         args = parser.parse_args()
 
         if args.command == 'trainer':
-            cls.ner_trainer(args.trainingset, args.output, args.model)
+            if args.patience is not None and not args.eval_split:
+                parser_trainer.error('--patience requires an --eval-split')
+            if args.fine_tune and not args.model:
+                parser_trainer.error('--fine-tune requires the trained --model')
+            if args.rehearsal_set and not args.fine_tune:
+                parser_trainer.error('--rehearsal-set requires --fine-tune')
+            cls.ner_trainer(args.trainingset, args.output, args.model,
+                            n_iter=args.epochs, dropout=args.dropout, batch_size=args.batch_size,
+                            eval_split=args.eval_split, patience=args.patience, n_process=args.n_process,
+                            checkpoint_every=args.checkpoint_every, resume=args.resume, fine_tune=args.fine_tune,
+                            rehearsal_set_path=args.rehearsal_set, rehearsal_ratio=args.rehearsal_ratio, seed=args.seed,
+                            export_dir=args.export)
+        elif args.command == 'convert':
+            cls.convert(args.trainingset, args.output)
+        elif args.command == 'export':
+            cls.export(args.model, args.output, args.keep_vectors)
+        elif args.command == 'serve':
+            if not args.matcher_model and not args.parser_model:
+                parser_server.error('at least one of --matcher-model or --parser-model is required')
+            cls.model_server(args.matcher_model, args.parser_model, args.address)
+        elif args.command == 'bench':
+            cls.bench(args.components, args.skills, args.messages, args.output,
+                      matcher=args.matcher, bert_model=args.bert_model, ner_model=args.ner_model, seed=args.seed)
@@ -0,0 +1,57 @@
+from threading import Event, Lock, Thread
+from typing import Callable
+from talosbot import logger
+
+
+class DeferredModel(object):
+    '''
+    Model proxy that loads the actual model on its first use, or right away in a background
+    thread when warming up, so the bot can connect to its channel meanwhile.
+    Any use before the model is ready waits until it's loaded
+    '''
+
+    def __init__(self, loader: Callable, name: str = 'model', background: bool = False) -> None:
+        self._loader = loader
+        self._name = name
+        self._model = None
+        self._error = None
+        self._lock = Lock()
+        self._ready = Event()
+        if background:
+            Thread(target=self._warm_up, name=f'talos-warmup-{name}', daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _warm_up(self) -> None:
+        try:
+            self.get()
+        except Exception as e:
+            # Raised again to the first caller of the model
+            logger.error('Background loading of %s failed: %s', self._name, e)
+
+    def get(self):
+        '''
+        Returns the loaded model, loading it if it's required
+        '''
+        if self._model is None:
+            with self._lock:
+                if self._error is not None:
+                    raise self._error
+                if self._model is None:
+                    logger.info('Loading %s', self._name)
+                    try:
+                        self._model = self._loader()
+                    except Exception as e:
+                        self._error = e
+                        raise
+                    self._ready.set()
+                    logger.info('Loaded %s', self._name)
+        return self._model
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
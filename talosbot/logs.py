@@ -1,19 +1,76 @@
+import atexit
+import json
 import logging
+import time
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from threading import Lock
 from typing import Optional
 
 DEFAULT_LOGGING_LEVEL = logging.INFO
 
+
+class JSONFormatter(logging.Formatter):
+    ''' Structured formatter, every record is a single json line '''
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': self.formatTime(record, self.datefmt),
+            'name': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class DebugRateLimitFilter(logging.Filter):
+    ''' Drops the debug records over the given rate, the rest of the levels always pass '''
+
+    def __init__(self, max_per_second: float) -> None:
+        super().__init__()
+        self.max_per_second = max_per_second
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.dropped = 0
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.window_count > self.max_per_second:
+                self.dropped += 1
+                return False
+            return True
+
+
 class LoggingBuilder(object):
     def __init__(self, 
                  level: int = DEFAULT_LOGGING_LEVEL,
                  fmt: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s", 
                  datefmt: str = "%Y-%m-%dT%H:%M:%S%z", 
-                 log_file: Optional[str] = None):
+                 log_file: Optional[str] = None,
+                 use_queue: bool = False,
+                 json_format: bool = False,
+                 debug_rate_limit: Optional[float] = None):
         self.level = level
         self.fmt = fmt
         self.datefmt = datefmt
         self.log_file = log_file
+        # The handlers I/O happens in a listener thread, callers only enqueue the records
+        self.use_queue = use_queue
+        self.json_format = json_format
+        self.debug_rate_limit = debug_rate_limit
+        self.listener = None
         self._logger = None
         
     def get_logger(self, name: str) -> Logger:
@@ -23,13 +80,29 @@ class LoggingBuilder(object):
         logger = logging.getLogger(name)
         if not logger.hasHandlers():
             logger.setLevel(self.level)
-            formatter = logging.Formatter(self.fmt, self.datefmt)
+            if self.json_format:
+                formatter = JSONFormatter(datefmt=self.datefmt)
+            else:
+                formatter = logging.Formatter(self.fmt, self.datefmt)
+            handlers = []
             stream_handler = logging.StreamHandler()
             stream_handler.setFormatter(formatter)
-            logger.addHandler(stream_handler)
+            handlers.append(stream_handler)
             if self.log_file:
                 file_handler = logging.FileHandler(self.log_file)
                 file_handler.setFormatter(formatter)
-                logger.addHandler(file_handler)
+                handlers.append(file_handler)
+            if self.use_queue:
+                log_queue = SimpleQueue()
+                logger.addHandler(QueueHandler(log_queue))
+                self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+                self.listener.start()
+                # Flush the pending records before exiting
+                atexit.register(self.listener.stop)
+            else:
+                for handler in handlers:
+                    logger.addHandler(handler)
+            if self.debug_rate_limit is not None:
+                logger.addFilter(DebugRateLimitFilter(self.debug_rate_limit))
             logger.propagate = False
         return logger
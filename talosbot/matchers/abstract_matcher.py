@@ -1,5 +1,9 @@
+import copy
+import inspect
 from abc import ABC, abstractmethod
 
+from talosbot import logger
+
 
 class AbstractMatcher(ABC):
     ''' Abstract matcher '''
@@ -22,6 +26,53 @@ class AbstractMatcher(ABC):
             return skill_func
         return decorator
     
+    def fork(self) -> 'AbstractMatcher':
+        '''
+        Returns a copy of the matcher without skills, sharing its models
+        '''
+        matcher = copy.copy(self)
+        matcher.available_skills = {}
+        matcher.start_reload()
+        return matcher
+
+    def reloaded(self, skills: dict) -> 'AbstractMatcher':
+        '''
+        Returns a new matcher with the given skills (sentence to skill dict, with its func, patterns
+        and any matcher option), this one is left untouched so it can keep serving meanwhile.
+        The options the match method of the matcher doesn't take are ignored
+        '''
+        matcher = self.fork()
+        parameters = inspect.signature(matcher.match).parameters
+        any_option = any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values())
+        for sentence, skill in skills.items():
+            options = {option: value for option, value in skill.items() if option not in ('func', 'patterns')}
+            unknown = [option for option in options if not any_option and option not in parameters]
+            if unknown:
+                logger.warning('Ignoring the options %s of the skill "%s", not taken by %s',
+                               ', '.join(unknown), sentence, type(matcher).__name__)
+                options = {option: value for option, value in options.items() if option not in unknown}
+            matcher.match(sentence, skill.get('patterns'), **options)(skill['func'])
+        matcher.finish_reload()
+        return matcher
+
+    def start_reload(self) -> None:
+        '''
+        Override it to copy the skills state a forked matcher must not share with the original one
+        '''
+        pass
+
+    def finish_reload(self) -> None:
+        '''
+        Override it to build the skills indexes before the reloaded matcher is used
+        '''
+        pass
+
+    def warm_up(self) -> None:
+        '''
+        Override it to build the skills indexes before the first message, instead of with it
+        '''
+        pass
+    
     def default_match(self):
         '''
         Decorator method for overriding a default skill
@@ -44,3 +95,17 @@ class AbstractMatcher(ABC):
         The matcher implementation requires this method with the matching logic
         '''
         pass
+    
+    def sentence_matcher_many(self, input_sentences: list) -> list:
+        '''
+        Batch version of the sentence matcher, it returns one matched sentence per input sentence
+        or the exception raised while matching it. Override it when the matcher can do better
+        than a sentence at a time
+        '''
+        results = []
+        for input_sentence in input_sentences:
+            try:
+                results.append(self.sentence_matcher(input_sentence))
+            except Exception as e:
+                results.append(e)
+        return results
@@ -1,8 +1,13 @@
+import copy
+import threading
+
+import numpy as np
 from numpy import ndarray
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from talosbot.loading import DeferredModel
 from talosbot.matchers.abstract_matcher import AbstractMatcher
+from talosbot.matchers.cache import EmbeddingCache
 from talosbot.matchers.exceptions import AmbiguousScoreException, NoMatchingSkillException
+from talosbot.matchers.indexes import AbstractVectorIndex, ExactIndex
 
 
 class BertMatcher(AbstractMatcher):
@@ -10,21 +15,132 @@ class BertMatcher(AbstractMatcher):
     
     DEFAULT_MODEL = 'bert-base-nli-mean-tokens'
     DEFAULT_ACCEPTANCE_THRESHOLD = .8
+    DEFAULT_AMBIGUITY_MARGIN = .0
     
     def __init__(self, **kwargs) -> None:
         super().__init__()
-        model_name = kwargs.get('model', self.DEFAULT_MODEL)
-        self.model = SentenceTransformer(model_name)
+        model_name = kwargs.get('model') or self.DEFAULT_MODEL
+        model_revision = kwargs.get('model_revision')
+        # eager (default), lazy (on the first use) or background (warm up in a thread)
+        model_loading = kwargs.get('model_loading', 'eager')
+        if kwargs.get('encoder') is not None:
+            # Already loaded model shared with other matchers (anything with its encode method works)
+            self.model = kwargs['encoder']
+        elif model_loading == 'eager':
+            self.model = self.load_model(model_name, model_revision)
+        else:
+            self.model = DeferredModel(lambda: self.load_model(model_name, model_revision),
+                                       name=model_name, background=model_loading == 'background')
         self.acceptance_threshold = kwargs.get('acceptance_threshold', self.DEFAULT_ACCEPTANCE_THRESHOLD)
+        # The match is ambiguous when the runner-up score is within this margin of the best one
+        self.ambiguity_margin = kwargs.get('ambiguity_margin', self.DEFAULT_AMBIGUITY_MARGIN)
+        # Optional persistent cache of the skill embeddings, shared across restarts and replicas
+        cache_dir = kwargs.get('cache_dir')
+        if cache_dir and kwargs.get('encoder') is not None and kwargs.get('model') is None:
+            # The cached embeddings are only valid for the model that computed them
+            raise ValueError('The embedding cache of an injected encoder requires the name of its model')
+        self.embedding_cache = EmbeddingCache(cache_dir, model_name, model_revision) if cache_dir else None
+        # Skill embeddings index, one L2 normalised row per registered sentence
+        self.index: AbstractVectorIndex = kwargs.get('index') or ExactIndex()
+        self._pending_sentences = []
+        # Held while the pending sentences are encoded, the searches wait for it
+        self._index_lock = threading.Lock()
+    
+    def load_model(self, model_name: str, model_revision: str = None):
+        '''
+        Loads the sentence transformer model, anything with its encode method works
+        '''
+        from sentence_transformers import SentenceTransformer
+        if model_revision is None:
+            return SentenceTransformer(model_name)
+        return SentenceTransformer(model_name, revision=model_revision)
+    
+    def match(self, sentence: str, patterns=None):
+        '''
+        Registers the skill and queues its sentence to be added to the embeddings index
+        '''
+        register = super().match(sentence, patterns)
+        def decorator(skill_func):
+            register(skill_func)
+            self._pending_sentences.append(sentence)
+            return skill_func
+        return decorator
+    
+    def start_reload(self) -> None:
+        self._pending_sentences = []
+        self._index_lock = threading.Lock()
+
+    def finish_reload(self) -> None:
+        # The unchanged skills keep their embeddings, only the new sentences are encoded
+        self.index = self.index.subset([sentence for sentence in self.available_skills if sentence in self.index])
+        self.build_index()
+    
+    def encode(self, sentences: list) -> ndarray:
+        '''
+        Encodes the sentences and returns their L2 normalised embeddings
+        '''
+        embeddings = np.asarray(self.model.encode(sentences), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+    
+    def encode_cached(self, sentences: list) -> ndarray:
+        '''
+        Same as encode, but only the sentences missing in the embedding cache (if any) are encoded
+        '''
+        if self.embedding_cache is None:
+            return self.encode(sentences)
+        embeddings = self.embedding_cache.get(sentences)
+        missing = [ith for ith, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            missing_sentences = [sentences[ith] for ith in missing]
+            missing_embeddings = self.encode(missing_sentences)
+            self.embedding_cache.put(missing_sentences, missing_embeddings)
+            for ith, embedding in zip(missing, missing_embeddings):
+                embeddings[ith] = embedding
+        return np.vstack(embeddings)
+    
+    def build_index(self) -> None:
+        '''
+        Encodes the pending registered sentences in one batch and adds them to the index,
+        sentences already indexed are skipped so the index only grows incrementally.
+        The callers wait while another thread builds it, and the grown index is swapped in
+        once complete, so the searches already running never see it half built
+        '''
+        with self._index_lock:
+            pending = self._pending_sentences
+            if not pending:
+                return
+            new_sentences = [sentence for sentence in dict.fromkeys(pending) if sentence not in self.index]
+            if new_sentences:
+                index = copy.deepcopy(self.index)
+                index.add(new_sentences, self.encode_cached(new_sentences))
+                self.index = index
+            # The sentences registered meanwhile are left for the next build
+            self._pending_sentences = self._pending_sentences[len(pending):]
+
+    def warm_up(self) -> None:
+        self.build_index()
+    
+    def top_k(self, input_sentence: str, k: int = 5, shortlist: list = None) -> list[tuple[str, float]]:
+        '''
+        Returns the k best scored skill sentences with their scores,
+        only the shortlisted skill sentences are scored when given
+        '''
+        self.build_index()
+        index = self.index
+        queries = self.encode([input_sentence])
+        if shortlist is None:
+            return index.search(queries, k)[0]
+        return index.search_keys(queries, shortlist, k)[0]
     
     def get_similarities(self, sentences: list, pattern: str) -> ndarray:
         '''
-        Executes the cosine similarity and returns its scores
+        Executes the cosine similarity and returns its scores, a (1, len(sentences)) matrix,
+        the embeddings are normalised so it's their dot product
         '''
-        sentences = [pattern] + sentences
-        sentence_embeddings = self.model.encode(sentences)
-        cosine_similarity_results = cosine_similarity([sentence_embeddings[0]], sentence_embeddings[1:])
-        return cosine_similarity_results
+        sentence_embeddings = self.encode([pattern] + sentences)
+        return sentence_embeddings[:1] @ sentence_embeddings[1:].T
     
     def match_sentence(self, sentence: str, pattern: str) -> dict[str, float | bool]:
         '''
@@ -51,26 +167,46 @@ class BertMatcher(AbstractMatcher):
                            })
         return results
     
-    def sentence_matcher(self, input_sentence: str) -> str:
-        sentences = list(self.available_skills.keys())
-        results = self.match_sentences(sentences, input_sentence)
+    def sentence_matcher(self, input_sentence: str, shortlist: list = None) -> str:
+        # The best and the runner-up are enough to validate the match
+        candidates = self.top_k(input_sentence, 2, shortlist)
+        return self.select_sentence(candidates)
+    
+    def sentence_matcher_many(self, input_sentences: list, shortlists: list = None) -> list:
+        '''
+        Batch version of the sentence matcher, all the input sentences are encoded in a single call.
+        Every input sentence may come with its own shortlist of skill sentences (None scores all of them)
+        '''
+        self.build_index()
+        index = self.index
+        queries = self.encode(input_sentences)
+        if shortlists is None:
+            all_candidates = index.search(queries, 2)
+        else:
+            all_candidates = [index.search(query[None], 2)[0] if shortlist is None
+                              else index.search_keys(query[None], shortlist, 2)[0]
+                              for query, shortlist in zip(queries, shortlists)]
+        results = []
+        for candidates in all_candidates:
+            try:
+                results.append(self.select_sentence(candidates))
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    def select_sentence(self, candidates: list[tuple[str, float]]) -> str:
+        '''
+        Picks the matched skill sentence from the best scored candidates
+        '''
         # Check results are returned
-        if len(results) == 0:
+        if len(candidates) == 0:
             raise NoMatchingSkillException("Couldn't match any sentence")
-        # Validate at least one threshold score exist and there is no ambiguity
-        scores = []
-        for result in results:
-            scores.append(result['score'])
-        if scores[-1] < self.acceptance_threshold:
-            raise NoMatchingSkillException(f"The maximum score ({scores[-1]}) doesn't reach the acceptance_threshold ({self.acceptance_threshold})")
-        if len(scores) > 1:
-            if sorted(scores)[-2:][0] == sorted(scores)[-2:][1]:
-                raise AmbiguousScoreException(f'Abiguous score, two sentences matched the same maximum score of {sorted(scores)[-2:][0]}')
-        # Now everything is ok, look for the maximum scored sentence
-        current_maximum_score = 0
-        for result in results:
-            current_score = result['score']
-            if current_score > current_maximum_score:
-                current_maximum_score = current_score
-                matched_sentence = result['sentence']
+        # Validate the threshold score is reached and there is no ambiguity
+        matched_sentence, maximum_score = candidates[0]
+        if maximum_score < self.acceptance_threshold:
+            raise NoMatchingSkillException(f"The maximum score ({maximum_score}) doesn't reach the acceptance_threshold ({self.acceptance_threshold})")
+        if len(candidates) > 1:
+            runner_up_sentence, runner_up_score = candidates[1]
+            if maximum_score - runner_up_score <= self.ambiguity_margin:
+                raise AmbiguousScoreException(f'Abiguous score, "{matched_sentence}" ({maximum_score}) and "{runner_up_sentence}" ({runner_up_score}) are within the ambiguity margin ({self.ambiguity_margin})')
         return matched_sentence
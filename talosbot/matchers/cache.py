@@ -0,0 +1,138 @@
+import json
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from hashlib import sha256
+from pathlib import Path
+
+import numpy as np
+from numpy import ndarray
+from talosbot import logger
+
+
+class EmbeddingCache(object):
+    '''
+    On-disk sentence embeddings cache, a memory-mapped .npy matrix plus a json manifest
+    keyed by model name, model revision and the hash of every cached sentence.
+    The writers of a directory are serialised with a lock file, and every write is a new
+    generation of the embeddings file, the previous one is kept for the readers of the old manifest
+    '''
+
+    MANIFEST_FILE = 'manifest.json'
+    LOCK_FILE = 'cache.lock'
+    # Manifest reads retried when its embeddings file was removed by newer generations meanwhile
+    LOAD_ATTEMPTS = 3
+
+    def __init__(self, cache_dir: str, model_name: str, model_revision: str = None) -> None:
+        self.model_name = model_name
+        self.model_revision = model_revision or 'default'
+        model_dir = re.sub(r'[^A-Za-z0-9_.@-]', '_', f'{self.model_name}@{self.model_revision}')
+        self.path = Path(cache_dir) / model_dir
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.rows = {}
+        self.embeddings = None
+        self.embeddings_file = None
+        self.load()
+
+    @staticmethod
+    def sentence_key(sentence: str) -> str:
+        '''
+        Hash used as the manifest key of a sentence
+        '''
+        return sha256(sentence.encode('utf-8')).hexdigest()
+
+    def load(self) -> None:
+        '''
+        Reads the manifest and memory-maps the embeddings it points to
+        '''
+        manifest_path = self.path / self.MANIFEST_FILE
+        for _ in range(self.LOAD_ATTEMPTS):
+            if not manifest_path.exists():
+                return
+            with open(manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get('model') != self.model_name or manifest.get('revision') != self.model_revision:
+                logger.warning('Ignoring embedding cache at %s, it was built for another model', self.path)
+                return
+            try:
+                self.embeddings = np.load(self.path / manifest['embeddings'], mmap_mode='r')
+            except FileNotFoundError:
+                continue
+            self.embeddings_file = manifest['embeddings']
+            self.rows = manifest['rows']
+            logger.debug('Loaded %d cached embeddings from %s', len(self.rows), self.path)
+            return
+        logger.warning('Ignoring embedding cache at %s, missing %s', self.path, manifest['embeddings'])
+
+    @contextmanager
+    def writer_lock(self):
+        '''
+        Exclusive lock of the cache directory, held while a new generation is written
+        '''
+        with open(self.path / self.LOCK_FILE, 'a+b') as lock_file:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            # Released when the file is closed
+            yield
+
+    def get(self, sentences: list) -> list[ndarray | None]:
+        '''
+        Returns the cached embedding of every sentence, or None when it's not cached
+        '''
+        results = []
+        for sentence in sentences:
+            row = self.rows.get(self.sentence_key(sentence))
+            results.append(None if row is None else self.embeddings[row])
+        return results
+
+    def put(self, sentences: list, embeddings: ndarray) -> None:
+        '''
+        Appends the new embeddings to the latest generation and atomically replaces the manifest,
+        so other processes sharing the directory never read a half written cache
+        '''
+        with self.writer_lock():
+            # Other processes may have written newer generations meanwhile
+            self.load()
+            rows = dict(self.rows)
+            new_positions = []
+            for position, sentence in enumerate(sentences):
+                key = self.sentence_key(sentence)
+                if key not in rows:
+                    rows[key] = len(rows)
+                    new_positions.append(position)
+            if not new_positions:
+                return
+            new_embeddings = np.asarray(embeddings, dtype=np.float32)[new_positions]
+            if self.embeddings is not None:
+                new_embeddings = np.vstack((self.embeddings, new_embeddings))
+            embeddings_file = f'embeddings-{uuid.uuid4().hex}.npy'
+            np.save(self.path / embeddings_file, new_embeddings)
+            manifest = {
+                'model': self.model_name,
+                'revision': self.model_revision,
+                'embeddings': embeddings_file,
+                'rows': rows,
+            }
+            manifest_tmp = self.path / f'{self.MANIFEST_FILE}.{uuid.uuid4().hex}.tmp'
+            with open(manifest_tmp, 'w') as manifest_file:
+                json.dump(manifest, manifest_file)
+            os.replace(manifest_tmp, self.path / self.MANIFEST_FILE)
+            previous_file = self.embeddings_file
+            self.rows = rows
+            self.embeddings = np.load(self.path / embeddings_file, mmap_mode='r')
+            self.embeddings_file = embeddings_file
+            # The previous generation is kept for the readers of the old manifest, the older ones can go
+            for old_path in self.path.glob('embeddings-*.npy'):
+                if old_path.name not in (embeddings_file, previous_file):
+                    try:
+                        old_path.unlink()
+                    except OSError:
+                        # Still mapped by another process on Windows, removed by a later write
+                        pass
+        logger.debug('Cached %d new embeddings into %s', len(new_positions), self.path)
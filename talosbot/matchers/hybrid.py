@@ -0,0 +1,192 @@
+import math
+import threading
+from collections import Counter, defaultdict
+
+from talosbot.matchers.abstract_matcher import AbstractMatcher
+from talosbot.matchers.bert import BertMatcher
+from talosbot.matchers.exceptions import NoMatchingSkillException
+from talosbot.matchers.regex import RegexMatcher
+from talosbot.matchers.text import normalize_sentence, tokenize
+
+
+class HybridMatcher(AbstractMatcher):
+    '''
+    Cascading matcher, the cheap lexical stages run first and the semantic (BERT) matcher
+    only scores what they cannot answer:
+    exact: the normalised message is a skill sentence
+    regex: the message matches the optional regex of a skill
+    keyword: a single skill has all its (idf weighted) words in the message, and they make
+             most of it (keyword_coverage), longer messages are left to the shortlist
+    shortlist: the semantic matcher only scores the skills sharing words with the message
+    semantic: no skill shares words with the message, every skill is scored
+    '''
+
+    STAGES = ('exact', 'regex', 'keyword', 'shortlist', 'semantic')
+    DEFAULT_SHORTLIST_SIZE = 16
+    DEFAULT_KEYWORD_THRESHOLD = 1.
+    DEFAULT_KEYWORD_COVERAGE = .5
+
+    def __init__(self, semantic_matcher: BertMatcher = None,
+                 shortlist_size: int = DEFAULT_SHORTLIST_SIZE,
+                 keyword_threshold: float = DEFAULT_KEYWORD_THRESHOLD,
+                 keyword_coverage: float = DEFAULT_KEYWORD_COVERAGE,
+                 **kwargs) -> None:
+        super().__init__()
+        # The keyword arguments configure the default semantic matcher
+        self.semantic_matcher = semantic_matcher if semantic_matcher is not None else BertMatcher(**kwargs)
+        self.regex_matcher = RegexMatcher()
+        # None disables the shortlist or the direct keyword answers
+        self.shortlist_size = shortlist_size
+        self.keyword_threshold = keyword_threshold
+        # Share of the message words the skill words must cover to be answered by the keyword stage
+        self.keyword_coverage = keyword_coverage
+        self.exact_sentences = {}
+        self.regex_sentences = {}
+        self.skill_tokens = {}
+        self.inverted_index = defaultdict(set)
+        self._weights = None
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def match(self, sentence: str, patterns=None, regex: str = None):
+        '''
+        Registers the skill in every stage, the regex is an optional pattern
+        answering the skill without scoring it
+        '''
+        register = super().match(sentence, patterns)
+        def decorator(skill_func):
+            register(skill_func)
+            self.semantic_matcher.match(sentence, patterns)(skill_func)
+            if regex is not None:
+                # Kept along the skill, so it's registered again when the skills are reloaded
+                self.available_skills[sentence]['regex'] = regex
+                self.regex_matcher.match(regex, patterns)(skill_func)
+                self.regex_sentences[regex] = sentence
+            self.exact_sentences[normalize_sentence(sentence)] = sentence
+            self.skill_tokens[sentence] = tokenize(sentence)
+            for token in self.skill_tokens[sentence]:
+                self.inverted_index[token].add(sentence)
+            # The word weights are recomputed with the next message
+            self._weights = None
+            return skill_func
+        return decorator
+
+    def start_reload(self) -> None:
+        self.semantic_matcher = self.semantic_matcher.fork()
+        self.regex_matcher = self.regex_matcher.fork()
+        self.exact_sentences = {}
+        self.regex_sentences = {}
+        self.skill_tokens = {}
+        self.inverted_index = defaultdict(set)
+        self._weights = None
+
+    def finish_reload(self) -> None:
+        self.semantic_matcher.finish_reload()
+        self.regex_matcher.finish_reload()
+        self.build_weights()
+
+    def warm_up(self) -> None:
+        self.semantic_matcher.warm_up()
+        self.regex_matcher.warm_up()
+        self.build_weights()
+
+    def _count(self, stage: str) -> None:
+        with self._stats_lock:
+            self.stats[stage] += 1
+
+    def hit_rates(self) -> dict[str, float]:
+        '''
+        Share of the matched messages answered by every stage
+        '''
+        with self._stats_lock:
+            total = sum(self.stats.values())
+            return {stage: self.stats[stage] / total if total else .0 for stage in self.STAGES}
+
+    def build_weights(self) -> tuple[dict, dict]:
+        '''
+        Computes the idf weight of every skill word and the total weight of every skill
+        '''
+        n_skills = len(self.skill_tokens)
+        token_weights = {token: math.log(1 + n_skills / len(sentences)) for token, sentences in self.inverted_index.items()}
+        skill_weights = {sentence: sum(token_weights[token] for token in tokens) or 1.
+                         for sentence, tokens in self.skill_tokens.items()}
+        self._weights = token_weights, skill_weights
+        return self._weights
+
+    def keyword_scores(self, input_sentence: str) -> list[tuple[str, float]]:
+        '''
+        Scores the skills sharing words with the message by the idf weighted share of their words
+        found in it, rare words weigh more than the words most of the skills have
+        '''
+        token_weights, skill_weights = self._weights if self._weights is not None else self.build_weights()
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for token in tokenize(input_sentence):
+            for sentence in self.inverted_index.get(token, ()):
+                scores[sentence] += token_weights[token]
+                matched[sentence] += 1
+        # A full match is exactly 1, the float sums run over sets in different orders
+        scores = [(sentence, 1. if matched[sentence] == len(self.skill_tokens[sentence]) else score / skill_weights[sentence])
+                  for sentence, score in scores.items()]
+        return sorted(scores, key=lambda item: item[1], reverse=True)
+
+    def covers_message(self, sentence: str, input_sentence: str) -> bool:
+        '''
+        Whether the skill words make the keyword_coverage share of the message words,
+        a short skill found in a long unrelated message is not enough to answer it
+        '''
+        message_tokens = tokenize(input_sentence)
+        return len(self.skill_tokens[sentence] & message_tokens) >= self.keyword_coverage * len(message_tokens)
+
+    def lexical_matcher(self, input_sentence: str) -> tuple[str, list]:
+        '''
+        Runs the lexical stages, it returns the stage and either the matched sentence,
+        or the shortlist the semantic matcher has to score (None for every skill)
+        '''
+        sentence = self.exact_sentences.get(normalize_sentence(input_sentence))
+        if sentence is not None:
+            return 'exact', sentence
+        if self.regex_sentences:
+            try:
+                return 'regex', self.regex_sentences[self.regex_matcher.sentence_matcher(input_sentence)]
+            except NoMatchingSkillException:
+                pass
+        candidates = self.keyword_scores(input_sentence)
+        if self.keyword_threshold is not None and candidates:
+            best_score = candidates[0][1]
+            runner_up_score = candidates[1][1] if len(candidates) > 1 else .0
+            reaches_threshold = best_score >= self.keyword_threshold or math.isclose(best_score, self.keyword_threshold)
+            if reaches_threshold and runner_up_score < best_score and self.covers_message(candidates[0][0], input_sentence):
+                return 'keyword', candidates[0][0]
+        if self.shortlist_size is None or not candidates:
+            return 'semantic', None
+        return 'shortlist', [sentence for sentence, _ in candidates[:self.shortlist_size]]
+
+    def sentence_matcher(self, input_sentence: str) -> str:
+        stage, result = self.lexical_matcher(input_sentence)
+        self._count(stage)
+        if stage in ('shortlist', 'semantic'):
+            return self.semantic_matcher.sentence_matcher(input_sentence, result)
+        return result
+
+    def sentence_matcher_many(self, input_sentences: list) -> list:
+        '''
+        Batch version of the sentence matcher, the messages left by the lexical stages
+        are scored by the semantic matcher in a single batch
+        '''
+        results = []
+        residual = []
+        for position, input_sentence in enumerate(input_sentences):
+            stage, result = self.lexical_matcher(input_sentence)
+            self._count(stage)
+            if stage in ('shortlist', 'semantic'):
+                residual.append((position, result))
+                results.append(None)
+            else:
+                results.append(result)
+        if residual:
+            scored = self.semantic_matcher.sentence_matcher_many([input_sentences[position] for position, _ in residual],
+                                                                 [shortlist for _, shortlist in residual])
+            for (position, _), result in zip(residual, scored):
+                results[position] = result
+        return results
@@ -0,0 +1,193 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+from numpy import ndarray
+
+
+def top_k_positions(scores: ndarray, k: int) -> ndarray:
+    '''
+    Positions of the k best scores along the last axis, sorted by descending score.
+    It partitions first, so only the k selected scores get sorted
+    '''
+    k = min(k, scores.shape[-1])
+    if k < scores.shape[-1]:
+        positions = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        positions = np.broadcast_to(np.arange(k), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, positions, axis=-1), axis=-1)
+    return np.take_along_axis(positions, order, axis=-1)
+
+
+class AbstractVectorIndex(ABC):
+    '''
+    Abstract vector index, it stores L2 normalised vectors under a key (the skill sentence)
+    and searches them by cosine similarity
+    '''
+
+    def __init__(self) -> None:
+        self.keys = []
+        self._rows = {}
+        # One row per key, stored by the implementation
+        self.vectors = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def add(self, keys: list, vectors: ndarray) -> None:
+        '''
+        Adds the vectors of the new keys, already indexed keys are skipped.
+        The vectors are stored before their keys are published
+        '''
+        new_keys = {}
+        for position, key in enumerate(keys):
+            if key not in self._rows and key not in new_keys:
+                new_keys[key] = position
+        if not new_keys:
+            return
+        self.add_vectors(np.asarray(vectors, dtype=np.float32)[list(new_keys.values())])
+        for key in new_keys:
+            self._rows[key] = len(self.keys)
+            self.keys.append(key)
+
+    def subset(self, keys: list) -> 'AbstractVectorIndex':
+        '''
+        Returns a new index, with the same settings, holding only the vectors of the given keys
+        '''
+        index = type(self)(**self.settings())
+        if keys:
+            index.add(keys, self.vectors[[self._rows[key] for key in keys]])
+        return index
+
+    def settings(self) -> dict:
+        '''
+        Override it with the constructor arguments of the index
+        '''
+        return {}
+
+    @abstractmethod
+    def add_vectors(self, vectors: ndarray) -> None:
+        '''
+        The index implementation requires this method to store the new rows
+        '''
+        pass
+
+    @abstractmethod
+    def search(self, queries: ndarray, k: int) -> list[list[tuple[str, float]]]:
+        '''
+        The index implementation requires this method returning, for every query,
+        its top k (key, score) pairs sorted by descending score
+        '''
+        pass
+
+    def search_keys(self, queries: ndarray, keys: list, k: int) -> list[list[tuple[str, float]]]:
+        '''
+        Same as search, but only the vectors stored under the given keys are scored
+        '''
+        rows = np.array([self._rows[key] for key in keys if key in self._rows], dtype=np.int64)
+        if not len(rows):
+            return [[] for _ in queries]
+        return [self._top_k(scores, rows, k) for scores in queries @ self.vectors[rows].T]
+
+    def _top_k(self, scores: ndarray, rows: ndarray, k: int) -> list[tuple[str, float]]:
+        '''
+        Keeps the best k scored rows
+        '''
+        return [(self.keys[rows[ith]], float(scores[ith])) for ith in top_k_positions(scores, k)]
+
+
+class ExactIndex(AbstractVectorIndex):
+    ''' Brute-force index, scores every stored vector with a single matrix product '''
+
+    def add_vectors(self, vectors: ndarray) -> None:
+        if self.vectors is None:
+            self.vectors = vectors
+        else:
+            self.vectors = np.vstack((self.vectors, vectors))
+
+    def search(self, queries: ndarray, k: int) -> list[list[tuple[str, float]]]:
+        if self.vectors is None:
+            return [[] for _ in queries]
+        similarities = queries @ self.vectors.T
+        # Select the top k of every query at once
+        positions = top_k_positions(similarities, k)
+        scores = np.take_along_axis(similarities, positions, axis=-1)
+        return [[(self.keys[row], float(score)) for row, score in zip(query_rows, query_scores)]
+                for query_rows, query_scores in zip(positions.tolist(), scores.tolist())]
+
+
+class IVFIndex(AbstractVectorIndex):
+    '''
+    Approximate inverted file index, the vectors are clustered with spherical k-means
+    and only the n_probe clusters closest to the query are scanned.
+    Raising n_probe increases the recall at the cost of latency
+    '''
+
+    DEFAULT_N_PROBE = 8
+    MIN_TRAINING_SIZE = 1024
+    KMEANS_ITERATIONS = 10
+
+    def __init__(self, n_lists: int = None, n_probe: int = DEFAULT_N_PROBE, seed: int = 0) -> None:
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self._trained_size = 0
+
+    def settings(self) -> dict:
+        return {'n_lists': self.n_lists, 'n_probe': self.n_probe, 'seed': self.seed}
+
+    def add_vectors(self, vectors: ndarray) -> None:
+        first_row = 0 if self.vectors is None else len(self.vectors)
+        self.vectors = vectors if self.vectors is None else np.vstack((self.vectors, vectors))
+        # Retrain every time the index doubles its size, otherwise just assign the new rows
+        if len(self.vectors) >= self.MIN_TRAINING_SIZE and len(self.vectors) >= 2 * self._trained_size:
+            self.train()
+        elif self.centroids is not None:
+            self._assign(np.arange(first_row, len(self.vectors)))
+
+    def train(self) -> None:
+        '''
+        Clusters the stored vectors and rebuilds the inverted lists
+        '''
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(self.vectors))))
+        n_lists = min(n_lists, len(self.vectors))
+        rng = np.random.default_rng(self.seed)
+        centroids = self.vectors[rng.choice(len(self.vectors), n_lists, replace=False)]
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignments = np.argmax(self.vectors @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = self.vectors[assignments == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1)
+        self.centroids = centroids
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self._assign(np.arange(len(self.vectors)))
+        self._trained_size = len(self.vectors)
+
+    def _assign(self, rows: ndarray) -> None:
+        '''
+        Appends the rows to the inverted list of their nearest centroid
+        '''
+        assignments = np.argmax(self.vectors[rows] @ self.centroids.T, axis=1)
+        for cluster in np.unique(assignments):
+            self.lists[cluster] = np.concatenate((self.lists[cluster], rows[assignments == cluster]))
+
+    def search(self, queries: ndarray, k: int) -> list[list[tuple[str, float]]]:
+        if self.vectors is None:
+            return [[] for _ in queries]
+        if self.centroids is None:
+            # Too small to be trained yet, the exact scan is cheap enough
+            rows = np.arange(len(self.keys))
+            return [self._top_k(scores, rows, k) for scores in queries @ self.vectors.T]
+        probes = top_k_positions(queries @ self.centroids.T, self.n_probe)
+        results = []
+        for query, clusters in zip(queries, probes):
+            rows = np.concatenate([self.lists[cluster] for cluster in clusters])
+            results.append(self._top_k(self.vectors[rows] @ query, rows, k))
+        return results
@@ -4,16 +4,87 @@ from talosbot.matchers.exceptions import NoMatchingSkillException
 
 class RegexMatcher(AbstractMatcher):
     ''' Matcher with regular expresions '''
+
+    # Numbered references would point to another group once the patterns are combined
+    NUMBERED_REFERENCE = re.compile(r'\\[1-9]|\(\?\(\d')
+
     def __init__(self) -> None:
         super().__init__()
-    
+        self.compiled_patterns = {}
+        self._engine = None
+
+    def match(self, sentence: str, patterns=None):
+        '''
+        Registers the skill and precompiles its sentence pattern
+        '''
+        register = super().match(sentence, patterns)
+        def decorator(skill_func):
+            self.compiled_patterns[sentence] = self.compiled_patterns.get(sentence) or re.compile(sentence)
+            register(skill_func)
+            # The engine is rebuilt with the next message
+            self._engine = None
+            return skill_func
+        return decorator
+
+    def start_reload(self) -> None:
+        # The compiled patterns of the unchanged skills are reused
+        self.compiled_patterns = dict(self.compiled_patterns)
+        self._engine = None
+
+    def finish_reload(self) -> None:
+        self.compiled_patterns = {sentence: self.compiled_patterns[sentence] for sentence in self.available_skills}
+        self.build_engine()
+
+    def warm_up(self) -> None:
+        self.build_engine()
+
+    def _is_combinable(self, compiled: re.Pattern) -> bool:
+        '''
+        Checks the pattern behaves the same when it's wrapped into a combined alternation
+        '''
+        return (compiled.flags == re.UNICODE
+                and not compiled.groupindex
+                and not self.NUMBERED_REFERENCE.search(compiled.pattern))
+
+    def build_engine(self) -> list:
+        '''
+        Combines the registered patterns into as few alternations as possible, keeping the
+        registration order so the first matching skill still wins. Every segment is a compiled
+        pattern with a mapping from its outer group index to the skill sentence,
+        patterns that cannot be combined are kept alone in their own segment
+        '''
+        engine = []
+        alternatives = []
+        groups = {}
+        def close_alternation():
+            if alternatives:
+                engine.append((re.compile('|'.join(alternatives)), dict(groups)))
+                alternatives.clear()
+                groups.clear()
+        group_index = 1
+        for sentence in self.available_skills:
+            compiled = self.compiled_patterns.get(sentence) or re.compile(sentence)
+            if self._is_combinable(compiled):
+                if not alternatives:
+                    group_index = 1
+                alternatives.append(f'({compiled.pattern})')
+                groups[group_index] = sentence
+                group_index += 1 + compiled.groups
+            else:
+                close_alternation()
+                engine.append((compiled, {None: sentence}))
+        close_alternation()
+        self._engine = engine
+        return engine
+
     def match_sentences(self, sentences: list, input_sentence: str) -> list:
         '''
         The actual matching implementation
         '''
         results = []
         for sentence in sentences:
-            if re.match(sentence, input_sentence):
+            compiled = self.compiled_patterns.get(sentence) or re.compile(sentence)
+            if compiled.match(input_sentence):
                 results.append(sentence)
         return results
 
@@ -21,11 +92,12 @@ class RegexMatcher(AbstractMatcher):
         '''
         Regex sentence matcher that returns the first occurrence
         '''
-        sentences = list(self.available_skills.keys())
-        results = self.match_sentences(sentences, input_sentence)
-        # Check results are returned
-        if len(results) == 0:
-            raise NoMatchingSkillException("Couldn't match any sentence")
-        # Just return always the first match
-        matched_sentence = results[0]
-        return matched_sentence
+        engine = self._engine if self._engine is not None else self.build_engine()
+        for compiled, groups in engine:
+            match = compiled.match(input_sentence)
+            if match:
+                if len(groups) == 1:
+                    return next(iter(groups.values()))
+                # The outer group of the matched alternative is always the last one closed
+                return groups[match.lastindex]
+        raise NoMatchingSkillException("Couldn't match any sentence")
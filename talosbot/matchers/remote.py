@@ -0,0 +1,28 @@
+from numpy import ndarray
+from talosbot.matchers.bert import BertMatcher
+from talosbot.server import DEFAULT_ADDRESS, connect
+
+
+class RemoteEncoder(object):
+    ''' Sentence transformer stand-in that forwards the encoding to the model server '''
+
+    def __init__(self, service) -> None:
+        self.service = service
+
+    def encode(self, sentences: list, **kwargs) -> ndarray:
+        return self.service.encode(list(sentences))
+
+
+class RemoteBertMatcher(BertMatcher):
+    '''
+    BERT matcher whose model lives in the model server, the skills index stays
+    in the worker while every encoding is sent to the server in batches
+    '''
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, authkey: bytes = None, **kwargs) -> None:
+        self.service = connect(address, authkey)
+        kwargs['model'] = self.service.info()['matcher_model']
+        super().__init__(**kwargs)
+
+    def load_model(self, model_name: str, model_revision: str = None) -> RemoteEncoder:
+        return RemoteEncoder(self.service)
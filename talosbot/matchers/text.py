@@ -0,0 +1,19 @@
+import re
+
+WHITESPACES = re.compile(r'\s+')
+TRAILING_PUNCTUATION = re.compile(r'[\s.!?¡¿]+$')
+WORDS = re.compile(r'\w+')
+
+
+def normalize_sentence(sentence: str) -> str:
+    '''
+    Case insensitive form of the sentence, with collapsed whitespaces and no trailing punctuation
+    '''
+    return TRAILING_PUNCTUATION.sub('', WHITESPACES.sub(' ', sentence.casefold().strip()))
+
+
+def tokenize(sentence: str) -> set:
+    '''
+    Distinct words of the normalised sentence
+    '''
+    return set(WORDS.findall(normalize_sentence(sentence)))
@@ -0,0 +1,203 @@
+import atexit
+import json
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from talosbot import logger
+
+# Latency buckets upper bounds, in seconds
+DEFAULT_BUCKETS = (.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., float('inf'))
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram(object):
+    ''' Fixed buckets histogram, cheap to update and estimating its percentiles by interpolation '''
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, percentile: float) -> float | None:
+        '''
+        Estimates the percentile assuming the values are uniform inside each bucket
+        '''
+        if self.count == 0:
+            return None
+        rank = self.count * percentile / 100
+        accumulated = 0
+        for ith, count in enumerate(self.counts):
+            if count and accumulated + count >= rank:
+                lower = self.buckets[ith - 1] if ith > 0 else 0.
+                upper = self.buckets[ith]
+                if upper == float('inf'):
+                    return lower
+                return lower + (upper - lower) * (rank - accumulated) / count
+            accumulated += count
+        return self.buckets[-2]
+
+    def snapshot(self) -> dict:
+        snapshot = {'count': self.count, 'sum': self.sum}
+        for percentile in PERCENTILES:
+            snapshot[f'p{percentile}'] = self.percentile(percentile)
+        return snapshot
+
+
+class Metrics(object):
+    '''
+    Bot metrics: latency histograms per pipeline stage and counters per skill.
+    Stages are match, extract, skill and dispatch, counters are hits (per skill sentence),
+    misses, default (fallbacks to the default skill), ambiguous and errors (failed skills of a batch)
+    '''
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+        self._lock = Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        '''
+        Times the enclosed block into the stage histogram
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, counter: str, skill: str = None) -> None:
+        with self._lock:
+            key = (counter, skill)
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        '''
+        Returns a json serializable copy of the current metrics
+        '''
+        counters = {}
+        for (counter, skill), value in list(self.counters.items()):
+            if skill is None:
+                counters[counter] = value
+            else:
+                counters.setdefault(counter, {})[skill] = value
+        return {
+            'stages': {stage: histogram.snapshot() for stage, histogram in list(self.histograms.items())},
+            'counters': counters,
+        }
+
+    def to_prometheus(self) -> str:
+        '''
+        Renders the metrics in the Prometheus text exposition format
+        '''
+        lines = ['# TYPE talos_stage_seconds histogram']
+        for stage, histogram in list(self.histograms.items()):
+            accumulated = 0
+            for upper, count in zip(histogram.buckets, histogram.counts):
+                accumulated += count
+                le = '+Inf' if upper == float('inf') else repr(upper)
+                lines.append(f'talos_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {accumulated}')
+            lines.append(f'talos_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'talos_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        declared = set()
+        for (counter, skill), value in sorted(self.counters.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+            name = f'talos_{counter}_total'
+            if name not in declared:
+                lines.append(f'# TYPE {name} counter')
+                declared.add(name)
+            labels = '' if skill is None else '{skill="%s"}' % skill.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class NullMetrics(object):
+    ''' Metrics with no operations, used when the bot metrics are disabled '''
+
+    def observe(self, stage: str, seconds: float) -> None:
+        pass
+
+    @contextmanager
+    def timer(self, stage: str):
+        yield
+
+    def increment(self, counter: str, skill: str = None) -> None:
+        pass
+
+    def snapshot(self) -> dict:
+        return {'stages': {}, 'counters': {}}
+
+
+class PrometheusExporter(object):
+    ''' Serves the metrics in the Prometheus text format from a local HTTP endpoint '''
+
+    DEFAULT_PORT = 9464
+
+    def __init__(self, metrics: Metrics, port: int = DEFAULT_PORT, host: str = '127.0.0.1') -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self) -> None:
+        '''
+        Starts serving the /metrics path in a daemon thread
+        '''
+        metrics = self.metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        Thread(target=self.server.serve_forever, name='talos-metrics', daemon=True).start()
+        logger.info('Serving metrics on http://%s:%d/metrics', self.host, self.server.server_port)
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+class JSONExporter(object):
+    ''' Dumps the metrics snapshot into a json file, by default when the process exits '''
+
+    def __init__(self, metrics: Metrics, path: str, at_exit: bool = True) -> None:
+        self.metrics = metrics
+        self.path = path
+        if at_exit:
+            atexit.register(self.dump)
+
+    def dump(self) -> None:
+        with open(self.path, 'w') as json_file:
+            json.dump(self.metrics.snapshot(), json_file, indent=2)
+        logger.info('Metrics dumped into %s', self.path)
@@ -13,3 +13,17 @@ class AbstractParser(ABC):
         The parser implementation requires this method with the extraction logic
         '''
         pass
+
+    def extract_parameters_many(self, sentences: list, extraction_patterns: list, all_required: bool=True) -> list:
+        '''
+        Batch version of the parameters extraction, with one extraction pattern per sentence.
+        It returns the parameters of every sentence or the exception raised while extracting them.
+        Override it when the parser can do better than a sentence at a time
+        '''
+        results = []
+        for sentence, patterns in zip(sentences, extraction_patterns):
+            try:
+                results.append(self.extract_parameters(sentence, patterns, all_required))
+            except Exception as e:
+                results.append(e)
+        return results
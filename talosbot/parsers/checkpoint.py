@@ -0,0 +1,101 @@
+import json
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from talosbot import logger
+
+if TYPE_CHECKING:
+    from spacy.language import Language
+
+
+class TrainingCheckpoint(object):
+    '''
+    NER training checkpoint, a directory with the model, the trainer counters (trainer_state.json),
+    the pickled optimizer and random state, and the best ner weights seen so far.
+    Every save is written aside and then swapped, so a crash never leaves a broken checkpoint
+    '''
+
+    MODEL_DIR = 'model'
+    STATE_FILE = 'trainer_state.json'
+    OPTIMIZER_FILE = 'optimizer.pickle'
+    BEST_WEIGHTS_FILE = 'best_ner.bin'
+    # Optimizer attributes keyed by (model node id, parameter name)
+    OPTIMIZER_STATES = ('mom1', 'mom2', 'averages', 'nr_update', 'last_seen')
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._next = self.path.with_name(f'{self.path.name}.next')
+        self._previous = self.path.with_name(f'{self.path.name}.previous')
+
+    def exists(self) -> bool:
+        self._recover()
+        return (self.path / self.STATE_FILE).exists()
+
+    def _recover(self) -> None:
+        # A crash between both renames leaves only the previous checkpoint
+        if not self.path.exists() and self._previous.exists():
+            os.replace(self._previous, self.path)
+
+    def save(self, model: 'Language', state: dict, optimizer, random_state, best_weights: bytes = None) -> None:
+        shutil.rmtree(self._next, ignore_errors=True)
+        self._next.mkdir(parents=True)
+        model.to_disk(self._next / self.MODEL_DIR)
+        with open(self._next / self.OPTIMIZER_FILE, 'wb') as optimizer_file:
+            pickle.dump({'optimizer': optimizer, 'random_state': random_state,
+                         'nodes': self.node_paths(model)}, optimizer_file)
+        if best_weights is not None:
+            (self._next / self.BEST_WEIGHTS_FILE).write_bytes(best_weights)
+        with open(self._next / self.STATE_FILE, 'w') as state_file:
+            json.dump(state, state_file)
+        if self.path.exists():
+            os.replace(self.path, self._previous)
+        os.replace(self._next, self.path)
+        shutil.rmtree(self._previous, ignore_errors=True)
+        logger.info('Saved checkpoint of iteration %d into %s', state['iteration'], self.path)
+
+    @staticmethod
+    def node_paths(model: 'Language') -> dict:
+        '''
+        Maps the model node ids, which change on every load, to their stable position in the pipeline
+        '''
+        return {node.id: (name, position)
+                for name, component in model.components if hasattr(component, 'model')
+                for position, node in enumerate(component.model.walk())}
+
+    def load_model(self) -> 'Language':
+        import spacy
+        model = spacy.load(self.path / self.MODEL_DIR)
+        # The pipes disabled while training were saved as disabled too
+        for name in list(model.disabled):
+            model.enable_pipe(name)
+        return model
+
+    def load(self, model: 'Language') -> tuple:
+        '''
+        Returns the trainer state, the optimizer, the random state and the best ner weights,
+        the optimizer moments are rekeyed to the node ids of the loaded model
+        '''
+        with open(self.path / self.STATE_FILE, 'r') as state_file:
+            state = json.load(state_file)
+        with open(self.path / self.OPTIMIZER_FILE, 'rb') as optimizer_file:
+            training = pickle.load(optimizer_file)
+        node_ids = {path: node_id for node_id, path in self.node_paths(model).items()}
+        node_ids = {old_id: node_ids[path] for old_id, path in training['nodes'].items() if path in node_ids}
+        optimizer = training['optimizer']
+        for attribute in self.OPTIMIZER_STATES:
+            values = getattr(optimizer, attribute, None)
+            if not values:
+                continue
+            rekeyed = {(node_ids[key[0]], key[1]): value for key, value in values.items() if key[0] in node_ids}
+            values.clear()
+            values.update(rekeyed)
+        best_weights_path = self.path / self.BEST_WEIGHTS_FILE
+        best_weights = best_weights_path.read_bytes() if best_weights_path.exists() else None
+        return state, optimizer, training['random_state'], best_weights
+
+    def clear(self) -> None:
+        for path in (self.path, self._next, self._previous):
+            shutil.rmtree(path, ignore_errors=True)
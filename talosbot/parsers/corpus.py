@@ -0,0 +1,110 @@
+import json
+import mmap
+import shutil
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Iterable
+
+# Unsigned 64 bits record offsets
+OFFSET_TYPECODE = 'Q'
+
+
+class TrainingCorpus(object):
+    '''
+    Compact binary NER training corpus, every record (sentence and entities) is msgpack encoded
+    and appended to a data file, with an offsets index so any record can be read by its position.
+    Both files are memory-mapped, so the corpus can be shuffled by index without loading it.
+    Close it, or use it as a context manager, to release the files
+    '''
+
+    DATA_SUFFIX = '.data'
+    INDEX_SUFFIX = '.index'
+    META_SUFFIX = '.meta.json'
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        with open(self._file(self.META_SUFFIX), 'r') as meta_file:
+            self.meta = json.load(meta_file)
+        self.labels = self.meta['labels']
+        self._data_file = open(self._file(self.DATA_SUFFIX), 'rb')
+        self._index_file = open(self._file(self.INDEX_SUFFIX), 'rb')
+        # Empty files cannot be mapped
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if self.meta['size'] else b''
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = memoryview(self._index).cast(OFFSET_TYPECODE)
+        # Removed on close, for the corpora converted on the fly
+        self._temporary_dir = None
+
+    @staticmethod
+    def is_corpus(path: str) -> bool:
+        '''
+        Checks the path points to a converted corpus
+        '''
+        return Path(f'{path}{TrainingCorpus.META_SUFFIX}').exists()
+
+    def _file(self, suffix: str) -> Path:
+        return Path(f'{self.path}{suffix}')
+
+    def __len__(self) -> int:
+        return self.meta['size']
+
+    def __getitem__(self, position: int) -> dict:
+        import srsly
+        if not 0 <= position < len(self):
+            raise IndexError(f'Record {position} out of the corpus range')
+        return srsly.msgpack_loads(self._data[self._offsets[position]:self._offsets[position + 1]])
+
+    def close(self) -> None:
+        self._offsets.release()
+        self._index.close()
+        if self.meta['size']:
+            self._data.close()
+        self._data_file.close()
+        self._index_file.close()
+        if self._temporary_dir is not None:
+            shutil.rmtree(self._temporary_dir, ignore_errors=True)
+            self._temporary_dir = None
+
+    def __enter__(self) -> 'TrainingCorpus':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @classmethod
+    def temporary(cls, records: Iterable[dict]) -> 'TrainingCorpus':
+        '''
+        Streams the records into a corpus in a temporary directory, removed when the corpus is closed
+        '''
+        temporary_dir = tempfile.mkdtemp(prefix='talosbot-corpus-')
+        try:
+            corpus = cls.write(records, Path(temporary_dir) / 'corpus')
+        except BaseException:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+            raise
+        corpus._temporary_dir = temporary_dir
+        return corpus
+
+    @classmethod
+    def write(cls, records: Iterable[dict], path: str) -> 'TrainingCorpus':
+        '''
+        Streams the records into a new corpus, collecting their entity labels meanwhile
+        '''
+        import srsly
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        labels = {}
+        offsets = array(OFFSET_TYPECODE, [0])
+        with open(f'{path}{cls.DATA_SUFFIX}', 'wb') as data_file:
+            for record in records:
+                record = {'sentence': record['sentence'], 'entities': record['entities']}
+                for entity in record['entities']:
+                    labels[entity['label']] = None
+                data_file.write(srsly.msgpack_dumps(record))
+                offsets.append(data_file.tell())
+        with open(f'{path}{cls.INDEX_SUFFIX}', 'wb') as index_file:
+            offsets.tofile(index_file)
+        with open(f'{path}{cls.META_SUFFIX}', 'w') as meta_file:
+            json.dump({'labels': list(labels), 'size': len(offsets) - 1}, meta_file)
+        return cls(path)
@@ -1,41 +1,121 @@
 import random
-import spacy
 import json
-import jsonschema
+from contextlib import ExitStack
 from importlib.util import find_spec
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
 
-import spacy.cli
-import spacy.cli.download
 from talosbot import logger
+from talosbot.cache import LRUCache
+from talosbot.loading import DeferredModel
 from talosbot.parsers.abstract_parser import AbstractParser
+from talosbot.parsers.checkpoint import TrainingCheckpoint
+from talosbot.parsers.corpus import TrainingCorpus
 from talosbot.parsers.exceptions import MissingParametersException
 
+if TYPE_CHECKING:
+    from spacy.language import Language
+
 class NERParser(AbstractParser):
     ''' NER parser that uses a spacy model, so it's flexible enough to customize it '''
 
-    def __init__(self, model_path) -> None:
+    DEFAULT_BATCH_SIZE = 64
+    DEFAULT_CACHE_SIZE = 1024
+    # Pipeline components the entities depend on, the rest of them are disabled
+    NER_COMPONENTS = ('tok2vec', 'transformer', 'ner', 'entity_ruler')
+
+    def __init__(self, model_path,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 n_process: int = 1,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 components: tuple = NER_COMPONENTS,
+                 model_loading: str = 'eager',
+                 exclude: tuple = (),
+                 disable: tuple = ()) -> None:
         super().__init__()
-        self.model = spacy.load(model_path)
-    
-    def extract_parameters(self, sentence: str, extraction_patterns: list, all_required=True) -> dict:
-        ''' Extraction of the detected entities '''
-        doc = self.model(sentence)
-        entities = set(extraction_patterns)
+        self.batch_size = batch_size
+        self.n_process = n_process
+        # eager (default), lazy (on the first use) or background (warm up in a thread)
+        if model_loading == 'eager':
+            self.model = self.load_model(model_path, components, exclude, disable)
+        else:
+            self.model = DeferredModel(lambda: self.load_model(model_path, components, exclude, disable),
+                                       name=str(model_path), background=model_loading == 'background')
+        # Entities found per sentence, chat commands are repeated verbatim quite often
+        self.cache = LRUCache(cache_size)
+
+    def load_model(self, model_path: str, components: tuple, exclude: tuple = (), disable: tuple = ()):
+        '''
+        Loads the spacy model keeping enabled only the given components,
+        the excluded components are not even loaded
+        '''
+        import spacy
+        model = spacy.load(model_path, exclude=list(exclude), disable=list(disable))
+        model.select_pipes(enable=[pipe for pipe in model.pipe_names if pipe in components])
+        logger.debug('NER pipeline components: %s', model.pipe_names)
+        return model
+
+    def find_entities(self, sentences: list) -> list[dict]:
+        '''
+        Runs the model over the sentences in a single batch and returns,
+        for every sentence, the text found for each entity label.
+        The worker processes are only started when each of them gets a full batch,
+        otherwise starting them costs far more than running the model inline
+        '''
+        indexes = []
+        if len(sentences) == 1:
+            docs = [self.model(sentences[0])]
+        else:
+            n_process = self.n_process if len(sentences) >= self.batch_size * self.n_process else 1
+            docs = self.model.pipe(sentences, batch_size=self.batch_size, n_process=n_process)
+        for sentence, doc in zip(sentences, docs):
+            # On repeated labels the last entity wins
+            indexes.append({ent.label_: ent.text for ent in doc.ents})
+            logger.debug('Doc ents for [%s]: %s', sentence, indexes[-1])
+        return indexes
+
+    def label_indexes(self, sentences: list) -> list[dict]:
+        '''
+        Same as find entities, but the sentences already cached are not processed again
+        '''
+        indexes = [self.cache.get(sentence) for sentence in sentences]
+        missing = list(dict.fromkeys(sentence for sentence, index in zip(sentences, indexes) if index is None))
+        if missing:
+            found = dict(zip(missing, self.find_entities(missing)))
+            for sentence, index in found.items():
+                self.cache.put(sentence, index)
+            indexes = [found[sentence] if index is None else index for sentence, index in zip(sentences, indexes)]
+        return indexes
+
+    def _extract(self, label_index: dict, extraction_patterns: list, all_required: bool) -> dict:
+        '''
+        Picks the requested entities from the label index
+        '''
         parameters = dict()
-        for entity in entities:
-            logger.debug(f'Found user defined entity: {entity}')
-            parameters[entity] = None
-            for ent in doc.ents:
-                ent_found = ent.label_
-                text = ent.text
-                logger.debug(f'Doc ent=[{ent_found}] has text=[{text}]')
-                if ent_found == entity:
-                    parameters[entity] = text
+        for entity in set(extraction_patterns):
+            logger.debug('Found user defined entity: %s', entity)
+            parameters[entity] = label_index.get(entity)
             if parameters[entity] is None and all_required:
                 raise MissingParametersException(f'Could not extract any parameter for {entity} entity')
         return parameters
 
+    def extract_parameters(self, sentence: str, extraction_patterns: list, all_required=True) -> dict:
+        ''' Extraction of the detected entities '''
+        label_index = self.label_indexes([sentence])[0]
+        return self._extract(label_index, extraction_patterns, all_required)
+
+    def extract_parameters_many(self, sentences: list, extraction_patterns: list, all_required: bool=True) -> list:
+        '''
+        Batch version of the extraction, the sentences go through nlp.pipe together
+        '''
+        results = []
+        for label_index, patterns in zip(self.label_indexes(sentences), extraction_patterns):
+            try:
+                results.append(self._extract(label_index, patterns, all_required))
+            except Exception as e:
+                results.append(e)
+        return results
+
 class NERTrainer(object):
     ''' NER trainer is a static class to train a custom model from a training set '''
     TRAINING_SET_SCHEMA = '''
@@ -94,6 +174,26 @@ class NERTrainer(object):
     }
     '''
 
+    DEFAULT_EPOCHS = 100
+    DEFAULT_DROPOUT = .5
+    DEFAULT_BATCH_SIZE = 32
+    # The minibatches start small and compound up to the batch size
+    MIN_BATCH_SIZE = 4
+    BATCH_SIZE_COMPOUND = 1.001
+
+    # Compiled schema validators
+    _validators = {}
+    # Examples sampled from a corpus to initialize the model
+    INITIALIZATION_SAMPLE = 1000
+    CHECKPOINT_DIR = 'checkpoint'
+    # Checkpointing writes the whole model, so it's only done when asked for
+    DEFAULT_CHECKPOINT_EVERY = None
+    DEFAULT_REHEARSAL_RATIO = 1.
+    # Components kept by the export, with the embedding layers the ner may listen to
+    EXPORT_COMPONENTS = ('ner', 'entity_ruler')
+    EMBEDDING_COMPONENTS = ('tok2vec', 'transformer')
+    TRAINING_SECTIONS = ('corpora', 'training', 'pretraining')
+
     def __new__(cls):
         '''
         Avoid this class to get an instance
@@ -101,20 +201,77 @@ class NERTrainer(object):
         raise TypeError('Cannot instansiate this static class')
     
     @classmethod
-    def load_training_set(cls, path: str) -> dict:
+    def get_validator(cls, name: str = 'training_set'):
+        '''
+        Returns the compiled validator of the training set schema ('training_set')
+        or of its single records ('record'), compiling it only once
+        '''
+        validator = cls._validators.get(name)
+        if validator is None:
+            import jsonschema
+            schema = json.loads(cls.TRAINING_SET_SCHEMA)
+            if name == 'record':
+                schema = dict(schema['properties']['training_data']['items'], **{'$schema': schema['$schema']})
+            validator_class = jsonschema.validators.validator_for(schema)
+            validator_class.check_schema(schema)
+            validator = cls._validators[name] = validator_class(schema)
+        return validator
+
+    @classmethod
+    def read_records(cls, path: str) -> Iterator[dict]:
+        '''
+        Streams the validated records of a training set: a json file, a jsonl file
+        (one record per line, an optional meta object is skipped) or a spacy DocBin file
+        '''
+        if path.endswith('.spacy'):
+            from spacy.tokens import DocBin
+            from spacy.vocab import Vocab
+            for doc in DocBin().from_disk(path).get_docs(Vocab()):
+                entities = [{'label': ent.label_, 'start': ent.start_char, 'end': ent.end_char} for ent in doc.ents]
+                yield {'sentence': doc.text, 'entities': entities}
+        elif path.endswith('.jsonl'):
+            validator = cls.get_validator('record')
+            with open(path, 'r') as jsonl_file:
+                for line in jsonl_file:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if 'meta' in record:
+                        continue
+                    validator.validate(record)
+                    yield record
+        else:
+            yield from cls.load_training_set(path)['training_data']
+
+    @classmethod
+    def convert(cls, path: str, output: str) -> 'TrainingCorpus':
+        '''
+        Converts any supported training set into a memory-mapped binary corpus
+        '''
+        corpus = TrainingCorpus.write(cls.read_records(path), output)
+        logger.info('Converted %d records with labels %s into %s', len(corpus), corpus.labels, output)
+        return corpus
+
+    @classmethod
+    def load_training_set(cls, path: str) -> 'dict | TrainingCorpus':
         '''
         Gets a valid path with a json trianing set,
         then verifies the json payload,
-        at last, returns the 
+        at last, returns the training set.
+        Converted corpora are memory-mapped instead, and jsonl or DocBin files are streamed
+        into a temporary corpus. The corpora must be closed once the training is done
         '''
-        schema = json.loads(cls.TRAINING_SET_SCHEMA)
+        if TrainingCorpus.is_corpus(path):
+            return TrainingCorpus(path)
+        if path.endswith(('.jsonl', '.spacy')):
+            return TrainingCorpus.temporary(cls.read_records(path))
         with open(path, 'r') as json_file:
             training_set = json.load(json_file)
-        jsonschema.validate(training_set, schema)
+        cls.get_validator().validate(training_set)
         return training_set
     
     @classmethod
-    def save_model(cls, model: spacy.language.Language, output_dir: str) -> None:
+    def save_model(cls, model: 'Language', output_dir: str) -> None:
         '''
         Save model into an output directory
         '''
@@ -123,70 +280,248 @@ class NERTrainer(object):
         if not output_dir.exists():
             output_dir.mkdir()
         model.to_disk(output_dir)
-        logger.info(f'Model saved into {output_dir}')
+        logger.info('Model saved into %s', output_dir)
     
     @classmethod
-    def train_model(cls, model: spacy.language.Language, training_set: dict, n_iter: int = 100) -> None:
+    def export_model(cls, model_path: str, output_dir: str, keep_vectors: bool = None) -> 'Language':
+        '''
+        Exports a slim inference model for the NER parser: the ner gets its own copy of any shared
+        embedding layer (tok2vec or transformer), then every other pipe and the training settings
+        are dropped. The word vectors are dropped too unless some kept pipe uses them
+        '''
+        import spacy
+        model = spacy.load(model_path)
+        keep = [name for name in model.component_names if name in cls.EXPORT_COMPONENTS]
+        if 'ner' not in keep:
+            raise ValueError(f'The model {model_path} has no ner pipe to export')
+        for source in cls.EMBEDDING_COMPONENTS:
+            if source in model.component_names:
+                listeners = [name for name in model.get_pipe(source).listening_components if name in keep]
+                for listener in listeners:
+                    model.replace_listeners(source, listener, ['model.tok2vec'])
+        for name in list(model.component_names):
+            if name not in keep:
+                model.remove_pipe(name)
+        if keep_vectors is None:
+            keep_vectors = any(node.name == 'static_vectors'
+                               for name, component in model.components if hasattr(component, 'model')
+                               for node in component.model.walk())
+        if not keep_vectors:
+            model.vocab.reset_vectors(width=0)
+        for section in cls.TRAINING_SECTIONS:
+            model.config.pop(section, None)
+        model.meta['talosbot'] = {'exported_from': str(model_path)}
+        cls.save_model(model, output_dir)
+        logger.info('Exported components %s (vectors: %s)', model.pipe_names, keep_vectors)
+        return model
+
+    @classmethod
+    def make_example(cls, doc, raw_example: dict):
+        '''
+        Converts a tokenized raw training example into a spacy example
+        '''
+        from spacy.training import Example
+        entities = [(ent['start'], ent['end'], ent['label']) for ent in raw_example['entities']]
+        return Example.from_dict(doc, {"entities": entities})
+
+    @classmethod
+    def make_examples(cls, model: 'Language', training_data: list, n_process: int = 1) -> list:
+        '''
+        Converts the raw training data into spacy examples, the tokenization runs
+        in n_process processes, with every other pipe disabled
+        '''
+        sentences = [raw_example['sentence'] for raw_example in training_data]
+        with model.select_pipes(disable=model.pipe_names):
+            docs = model.pipe(sentences, n_process=n_process, batch_size=cls.DEFAULT_BATCH_SIZE)
+            examples = [cls.make_example(doc, raw_example) for doc, raw_example in zip(docs, training_data)]
+        return examples
+
+    @classmethod
+    def iter_examples(cls, model: 'Language', records, items: list) -> Iterator:
+        '''
+        Lazily converts the records (a corpus or a list) at the given positions,
+        items which are already examples are passed through
+        '''
+        for item in items:
+            if isinstance(item, int):
+                raw_example = records[item]
+                item = cls.make_example(model.make_doc(raw_example['sentence']), raw_example)
+            yield item
+
+    @classmethod
+    def train_model(cls, model: 'Language', training_set: 'dict | TrainingCorpus',
+                    n_iter: int = DEFAULT_EPOCHS,
+                    dropout: float = DEFAULT_DROPOUT,
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    eval_split: float = .0,
+                    patience: int = None,
+                    n_process: int = 1,
+                    checkpoint: TrainingCheckpoint = None,
+                    checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+                    resume: bool = False,
+                    fine_tune: bool = False,
+                    rehearsal_set: 'dict | TrainingCorpus' = None,
+                    rehearsal_ratio: float = DEFAULT_REHEARSAL_RATIO,
+                    seed: int = None) -> None:
         '''
         Get a well formatted training set
-        and generates a model in the specified path
+        and generates a model in the specified path.
+        The examples are converted once and trained in compounding minibatches (up to batch_size),
+        when eval_split is given that share of them is held out to evaluate every epoch,
+        stopping after patience epochs without improvement and keeping the best weights.
+        A converted corpus is never loaded, its training records are read and converted
+        batch by batch in a shuffled order every epoch.
+        With a checkpoint the trainer state is saved every checkpoint_every epochs (never when None), and resumed
+        from it when resume is set. When fine_tune is set the already trained model is updated
+        instead of initialized, mixing every epoch a rehearsal sample of the old training set
+        (rehearsal_ratio times the new examples) to avoid forgetting what it knew
         '''
-        training_data = training_set['training_data']
+        from spacy.util import compounding, minibatch
+        streamed = isinstance(training_set, TrainingCorpus)
+        labels = training_set.labels if streamed else training_set['meta']['labels']
+        state = {
+            'iteration': -1,
+            'seed': random.randrange(2 ** 32) if seed is None else seed,
+            'best_score': None,
+            'epochs_without_improvement': 0,
+        }
+        optimizer = random_state = best_weights = None
+        if resume:
+            state, optimizer, random_state, best_weights = checkpoint.load(model)
+            logger.info('Resuming the training after iteration %d', state['iteration'])
+        # The seed is kept in the checkpoint, so a resumed training holds out the same examples
+        rng = random.Random(state['seed'])
         # Setup the ner pipe and put the custom labels
         if 'ner' not in model.pipe_names:
             ner = model.add_pipe('ner')
         else:
             ner = model.get_pipe('ner')
-        for label in training_set['meta']['labels']:
+        for label in labels:
             if label not in ner.labels:
                 ner.add_label(label)
-        # Initialize the model
-        model.initialize()
+        if streamed:
+            train_examples = list(range(len(training_set)))
+            rng.shuffle(train_examples)
+            n_eval = int(len(train_examples) * eval_split)
+            eval_examples = cls.make_examples(model, [training_set[i] for i in train_examples[:n_eval]], n_process)
+            train_examples = train_examples[n_eval:]
+            sample = train_examples[:cls.INITIALIZATION_SAMPLE]
+            get_examples = lambda: list(cls.iter_examples(model, training_set, sample))
+        else:
+            examples = cls.make_examples(model, training_set['training_data'], n_process)
+            rng.shuffle(examples)
+            n_eval = int(len(examples) * eval_split)
+            eval_examples, train_examples = examples[:n_eval], examples[n_eval:]
+            get_examples = lambda: train_examples
+        logger.info('Training with %d examples, %d held out for evaluation', len(train_examples), len(eval_examples))
+        rehearsal = None
+        if rehearsal_set is not None:
+            rehearsal = rehearsal_set if isinstance(rehearsal_set, TrainingCorpus) else rehearsal_set['training_data']
+            n_rehearsal = min(len(rehearsal), int(len(train_examples) * rehearsal_ratio))
+            logger.info('Rehearsing %d old examples every iteration', n_rehearsal)
+        if resume:
+            rng.setstate(random_state)
+        elif fine_tune:
+            # Keep the trained weights, adding only the optimizer and the rehearsal setup
+            optimizer = model.resume_training()
+        else:
+            # Initialize the model
+            model.initialize(get_examples)
+            optimizer = model.create_optimizer()
         # Disable other pipes and train only NER
         other_pipes = [pipe for pipe in model.pipe_names if pipe != 'ner']
         with model.disable_pipes(*other_pipes):
-            optimizer = model.create_optimizer()
-            for ith in range(n_iter):
-                logger.debug(f'Starting iteration #{ith}')
-                random.shuffle(training_data)
+            batch_sizes = compounding(min(cls.MIN_BATCH_SIZE, batch_size), batch_size, cls.BATCH_SIZE_COMPOUND)
+            for ith in range(state['iteration'] + 1, n_iter):
+                logger.debug('Starting iteration #%d', ith)
+                epoch_examples = list(train_examples)
+                if rehearsal is not None:
+                    positions = rng.sample(range(len(rehearsal)), n_rehearsal)
+                    epoch_examples.extend(cls.iter_examples(model, rehearsal, positions))
+                rng.shuffle(epoch_examples)
                 losses = {}
-                for raw_example in training_data:
-                    doc = model.make_doc(raw_example['sentence'])
-                    entities = [(ent['start'], ent['end'], ent['label']) for ent in raw_example['entities']]
-                    example = spacy.training.example.Example.from_dict(doc, {"entities": entities})
+                batches = cls.iter_examples(model, training_set, epoch_examples) if streamed else epoch_examples
+                for batch in minibatch(batches, size=batch_sizes):
                     model.update(
-                        [example],
-                        drop=0.5,
+                        batch,
+                        drop=dropout,
                         sgd=optimizer,
                         losses=losses)
-                    logger.debug(losses)
-                logger.info(f'Iteration {ith} - Losses: {losses}')
-                logger.debug(f'End of iteration #{ith}')
+                    logger.debug('Losses: %s', losses)
+                if eval_examples:
+                    score = model.evaluate(eval_examples)['ents_f'] or .0
+                    logger.info('Iteration %d - Losses: %s - Eval F-score: %.4f', ith, losses, score)
+                    if state['best_score'] is None or score > state['best_score']:
+                        state['best_score'] = score
+                        best_weights = model.get_pipe('ner').to_bytes()
+                        state['epochs_without_improvement'] = 0
+                    else:
+                        state['epochs_without_improvement'] += 1
+                else:
+                    logger.info('Iteration %d - Losses: %s', ith, losses)
+                logger.debug('End of iteration #%d', ith)
+                state['iteration'] = ith
+                if checkpoint is not None and checkpoint_every and (ith + 1) % checkpoint_every == 0:
+                    checkpoint.save(model, state, optimizer, rng.getstate(), best_weights)
+                if patience is not None and state['epochs_without_improvement'] >= patience:
+                    logger.info('Early stopping at iteration %d, best F-score: %.4f', ith, state['best_score'])
+                    break
+            if best_weights is not None:
+                model.get_pipe('ner').from_bytes(best_weights)
 
-    
     @classmethod
-    def build_model(cls, from_model: str = None) -> spacy.language.Language:
+    def build_model(cls, from_model: str = None) -> 'Language':
         '''
-        Load a model from blank default or load specified model
+        Load a model from blank default or load specified model (a package name or a model directory)
         '''
+        import spacy
+        import spacy.cli
         if from_model:
-            if not find_spec(from_model):
+            if not Path(from_model).exists() and not find_spec(from_model):
                 # If the model is not found, try to download it
                 spacy.cli.download(from_model)
             model = spacy.load(from_model)
-            logger.info(f'Loaded model: {from_model}')
+            logger.info('Loaded model: %s', from_model)
         else:
             model = spacy.blank('en')
-            logger.info(f'Created blank "en" model')
+            logger.info('Created blank "en" model')
         return model
 
     @classmethod
-    def run(cls, training_set_path: str, output_model: str, from_model: str = None) -> None:
+    def run(cls, training_set_path: str, output_model: str, from_model: str = None,
+            resume: bool = False, rehearsal_set_path: str = None, export_dir: str = None,
+            **training_options) -> None:
         '''
-        Main program execution
+        Main program execution, the training options are passed through to the train model method.
+        When checkpoint_every is given, or the training is resumed (then every epoch unless given),
+        checkpoints are kept in the output directory while training, so a failed training
+        can be resumed, and removed once the model is saved.
+        The slim inference model is exported too when an export directory is given
         '''
-        model = cls.build_model(from_model)
-        training_set = cls.load_training_set(training_set_path)
-        cls.train_model(model, training_set)
+        if resume and not training_options.get('checkpoint_every'):
+            training_options['checkpoint_every'] = 1
+        checkpoint = None
+        if training_options.get('checkpoint_every'):
+            checkpoint = TrainingCheckpoint(Path(output_model) / cls.CHECKPOINT_DIR)
+        if resume and not checkpoint.exists():
+            logger.warning('No checkpoint found in %s, training from the start', output_model)
+            resume = False
+        if resume:
+            model = checkpoint.load_model()
+            logger.info('Loaded checkpoint: %s', checkpoint.path)
+        else:
+            model = cls.build_model(from_model)
+        with ExitStack() as training_sets:
+            training_set = cls.load_training_set(training_set_path)
+            if isinstance(training_set, TrainingCorpus):
+                training_sets.enter_context(training_set)
+            if rehearsal_set_path:
+                rehearsal_set = training_options['rehearsal_set'] = cls.load_training_set(rehearsal_set_path)
+                if isinstance(rehearsal_set, TrainingCorpus):
+                    training_sets.enter_context(rehearsal_set)
+            cls.train_model(model, training_set, checkpoint=checkpoint, resume=resume, **training_options)
         cls.save_model(model, output_model)
-        
\ No newline at end of file
+        if checkpoint is not None:
+            checkpoint.clear()
+        if export_dir:
+            cls.export_model(output_model, export_dir)
@@ -1,18 +1,56 @@
 import re
+from talosbot import logger
 from talosbot.parsers.abstract_parser import AbstractParser
 from talosbot.parsers.exceptions import MissingParametersException
 
 
 class RegexParser(AbstractParser):
     ''' Parser using regular expressions '''
-    def __init__(self) -> None:
+
+    # A leading .* makes the search quadratic on long lines
+    LEADING_WILDCARD = re.compile(r'^\.\*')
+    # A leading lazy .*? extracts the same first occurrence the search finds without it,
+    # unless another alternative could match earlier
+    LEADING_LAZY_WILDCARD = re.compile(r'^(?:\.\*\?)+')
+    # A trailing .* (greedy, lazy or possessive) always matches, so it never changes the extraction
+    TRAILING_WILDCARD = re.compile(r'(?<!\\)(?:\.\*[?+]?)+$')
+
+    def __init__(self, strip_wildcards: bool=False) -> None:
         super().__init__()
+        self.strip_wildcards = strip_wildcards
+        self._compiled_patterns = {}
+
+    def compile_expression(self, expression: str) -> re.Pattern:
+        '''
+        Compiles an extraction expression, when enabled its leading and trailing wildcards
+        are stripped as long as the extracted parameter is the same without them
+        '''
+        if self.strip_wildcards:
+            stripped = self.LEADING_LAZY_WILDCARD.sub('', expression)
+            if '|' not in stripped:
+                expression = stripped
+            expression = self.TRAILING_WILDCARD.sub('', expression)
+        if self.LEADING_WILDCARD.match(expression):
+            logger.warning('The leading .* of the extraction pattern "%s" '
+                           'makes its search quadratic on long messages', expression)
+        return re.compile(expression)
+
+    def compile_patterns(self, extraction_patterns: dict) -> list:
+        '''
+        Returns the compiled extraction patterns, compiling them only the first time
+        '''
+        key = tuple(extraction_patterns.items())
+        compiled_patterns = self._compiled_patterns.get(key)
+        if compiled_patterns is None:
+            compiled_patterns = [(name, self.compile_expression(expression)) for name, expression in key]
+            self._compiled_patterns[key] = compiled_patterns
+        return compiled_patterns
 
     def extract_parameters(self, sentence: str, extraction_patterns: dict, all_required: bool=True) -> dict:
         ''' This method uses search so it's an implicit .* at the begining '''
         parameters = dict()
-        for name, expression in extraction_patterns.items():
-            match = re.search(expression, sentence)
+        for name, compiled in self.compile_patterns(extraction_patterns):
+            match = compiled.search(sentence)
             if match:
                 parameters[name] = match.group(1)
             elif all_required:
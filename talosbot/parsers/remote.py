@@ -0,0 +1,19 @@
+from talosbot.parsers.ner import NERParser
+from talosbot.server import DEFAULT_ADDRESS, connect
+
+
+class RemoteNERParser(NERParser):
+    '''
+    NER parser whose spacy pipeline lives in the model server,
+    the entities are found there while the results cache stays in the worker
+    '''
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, authkey: bytes = None, **kwargs) -> None:
+        self.service = connect(address, authkey)
+        super().__init__(self.service.info()['parser_model'], **kwargs)
+
+    def load_model(self, model_path: str, components: tuple, exclude: tuple = (), disable: tuple = ()):
+        return self.service
+
+    def find_entities(self, sentences: list) -> list[dict]:
+        return self.service.label_indexes(sentences)
@@ -0,0 +1,121 @@
+import asyncio
+from talosbot.batching import BatchingEncoder
+from talosbot.metrics import Metrics, NullMetrics
+from talosbot.talos import Bot, Message
+from talosbot import logger
+
+
+class BotRouter(object):
+    '''
+    Multi-tenant router, it hosts the bots of many tenants behind a single channel and process.
+    Every tenant keeps its own skills (and skill index), while the expensive models are shared:
+    one sentence encoder, batching the concurrent encodings of every tenant, and one parser.
+    The messages are routed by the tenant name in their meta (if any) or by their first word
+    '''
+
+    DEFAULT_UNKNOWN_MESSAGE = 'Unknown bot, try one of: {tenants}'
+
+    def __init__(self, channel,
+                 encoder=None,
+                 encoder_model: str = None,
+                 parser=None,
+                 metrics: Metrics = None,
+                 unknown_message: str = DEFAULT_UNKNOWN_MESSAGE) -> None:
+        self.channel = channel
+        self.encoder_model = encoder_model
+        # Shared encoder, the model is loaded here unless an already loaded one is given
+        if encoder is None and encoder_model is not None:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(encoder_model)
+        self.encoder = BatchingEncoder(encoder) if encoder is not None else None
+        self.parser = parser
+        self.metrics = metrics or NullMetrics()
+        self.unknown_message = unknown_message
+        self.tenants = {}
+        self.channel.set_bot(self)
+
+    def bert_matcher(self, **kwargs):
+        '''
+        Returns a new BERT matcher, with its own skill index, on top of the shared encoder.
+        Its embedding cache (cache_dir) requires the encoder model, or the model option naming the given encoder
+        '''
+        from talosbot.matchers.bert import BertMatcher
+        if self.encoder is None:
+            raise ValueError('The router has no shared encoder, give it an encoder or an encoder model')
+        kwargs.setdefault('model', self.encoder_model)
+        return BertMatcher(encoder=self.encoder, **kwargs)
+
+    def add_tenant(self, name: str, matcher, parser=None, **bot_options) -> Bot:
+        '''
+        Registers the tenant bot, with the shared parser unless another one is given.
+        Its skills are registered as usual with the match decorator of the returned bot
+        '''
+        if parser is None and self.parser is None:
+            raise ValueError(f'The tenant {name} requires a parser, the router has no shared one')
+        bot_options.setdefault('metrics', self.metrics)
+        bot = Bot(matcher, parser or self.parser, None, **bot_options)
+        self.tenants[name] = bot
+        logger.info('Registered bot tenant %s', name)
+        return bot
+
+    def route(self, user_message: Message) -> tuple:
+        '''
+        Returns the tenant bot of the message (None when unknown) and the message to pass to it
+        '''
+        meta = user_message.meta
+        if isinstance(meta, dict) and meta.get('tenant') is not None:
+            return self.tenants.get(meta['tenant']), user_message
+        name, _, sentence = user_message.message.strip().partition(' ')
+        return self.tenants.get(name), Message(sentence.strip(), meta)
+
+    def unknown_tenant(self, user_message: Message) -> Message:
+        self.metrics.increment('unknown_tenant')
+        return Message(self.unknown_message.format(tenants=', '.join(self.tenants)), user_message.meta)
+
+    def message_handler(self, user_message: Message) -> Message:
+        bot, message = self.route(user_message)
+        if bot is None:
+            return self.unknown_tenant(user_message)
+        return bot.message_handler(message)
+
+    async def async_message_handler(self, user_message: Message) -> Message:
+        bot, message = self.route(user_message)
+        if bot is None:
+            return self.unknown_tenant(user_message)
+        return await bot.async_message_handler(message)
+
+    async def default_response(self, user_message: Message) -> Message:
+        '''
+        Answers the message with the default skill of its tenant, used for the messages whose processing failed
+        '''
+        bot, message = self.route(user_message)
+        if bot is None:
+            return self.unknown_tenant(user_message)
+        return await bot.default_response(message)
+
+    async def async_message_handler_many(self, user_messages: list) -> list[Message]:
+        '''
+        Batch version of the async message handler, the messages of every tenant are handled
+        as a batch, the tenants run concurrently so their encodings get batched together
+        '''
+        responses = [None] * len(user_messages)
+        batches = {}
+        for ith, user_message in enumerate(user_messages):
+            bot, message = self.route(user_message)
+            if bot is None:
+                responses[ith] = self.unknown_tenant(user_message)
+            else:
+                batches.setdefault(id(bot), (bot, []))[1].append((ith, message))
+        async def handle(bot, batch):
+            for (ith, _), response in zip(batch, await bot.async_message_handler_many([message for _, message in batch])):
+                responses[ith] = response
+        await asyncio.gather(*[handle(bot, batch) for bot, batch in batches.values()])
+        return responses
+
+    def run(self) -> None:
+        '''
+        Main module execution
+        '''
+        for bot in self.tenants.values():
+            bot.warm_up()
+        self.channel.establish()
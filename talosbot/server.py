@@ -0,0 +1,155 @@
+import os
+import secrets
+import socket
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from talosbot import logger
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+# Private to the user, the manager unpickles whatever its authenticated clients send
+DEFAULT_ADDRESS = os.path.join(os.getenv('XDG_RUNTIME_DIR') or os.path.join(os.path.expanduser('~'), '.talosbot'),
+                               'talosbot', 'server.sock')
+AUTHKEY_FILE = 'authkey'
+
+
+def authkey_path(address: str) -> Path:
+    '''
+    Key file written by the server next to its socket
+    '''
+    return Path(address).parent / AUTHKEY_FILE
+
+
+def get_authkey(address: str = DEFAULT_ADDRESS, create: bool = False) -> bytes:
+    '''
+    Authentication key shared by the model server and its clients, taken from
+    the TALOS_SERVER_AUTHKEY environment variable or else from the key file of the server.
+    The server creates a random key file, readable only by its user, when there is none
+    '''
+    authkey = os.getenv('TALOS_SERVER_AUTHKEY')
+    if authkey:
+        return authkey.encode()
+    path = authkey_path(address)
+    if path.exists():
+        return path.read_bytes().strip()
+    if not create:
+        raise RuntimeError(f'No authkey found, set TALOS_SERVER_AUTHKEY or start the model server to create {path}')
+    authkey = secrets.token_hex(32).encode()
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, 'wb') as authkey_file:
+        authkey_file.write(authkey)
+    logger.info('Created the model server authkey file %s', path)
+    return authkey
+
+
+def is_listening(address: str) -> bool:
+    '''
+    Checks whether some server answers on the unix socket
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+
+class ModelManager(BaseManager):
+    ''' Multiprocessing manager exposing the shared models service '''
+    pass
+
+
+ModelManager.register('models')
+
+
+class ModelService(object):
+    '''
+    Hosts the BERT sentence transformer and the spacy NER pipeline, so they are loaded
+    only once per host and shared by every bot worker connected to the server
+    '''
+
+    def __init__(self, matcher_model: str = None, parser_model: str = None) -> None:
+        self.matcher_model = matcher_model
+        self.parser_model = parser_model
+        self.encoder = None
+        self.parser = None
+        # The manager serves each client connection from its own thread
+        self._encoder_lock = Lock()
+        self._parser_lock = Lock()
+        if matcher_model:
+            from sentence_transformers import SentenceTransformer
+            self.encoder = SentenceTransformer(matcher_model)
+            logger.info('Loaded matcher model: %s', matcher_model)
+        if parser_model:
+            from talosbot.parsers.ner import NERParser
+            self.parser = NERParser(parser_model)
+            logger.info('Loaded parser model: %s', parser_model)
+
+    def info(self) -> dict:
+        '''
+        Returns the models hosted by the server
+        '''
+        return {'matcher_model': self.matcher_model, 'parser_model': self.parser_model}
+
+    def encode(self, sentences: list) -> 'ndarray':
+        '''
+        Encodes the sentences with the hosted sentence transformer
+        '''
+        if self.encoder is None:
+            raise RuntimeError('The model server is not hosting any matcher model')
+        import numpy as np
+        with self._encoder_lock:
+            return np.asarray(self.encoder.encode(sentences), dtype=np.float32)
+
+    def label_indexes(self, sentences: list) -> list[dict]:
+        '''
+        Finds the entities of the sentences with the hosted NER parser (and its cache)
+        '''
+        if self.parser is None:
+            raise RuntimeError('The model server is not hosting any parser model')
+        with self._parser_lock:
+            return self.parser.label_indexes(sentences)
+
+
+class ModelServer(object):
+    ''' Long-lived local inference server listening on a unix socket '''
+
+    def __init__(self, matcher_model: str = None, parser_model: str = None,
+                 address: str = DEFAULT_ADDRESS, authkey: bytes = None) -> None:
+        self.address = address
+        # The socket directory is created private to the user
+        Path(address).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.authkey = authkey or get_authkey(address, create=True)
+        self.service = ModelService(matcher_model, parser_model)
+
+    def serve_forever(self) -> None:
+        '''
+        Listens for clients until the process is interrupted
+        '''
+        if is_listening(self.address):
+            raise RuntimeError(f'A model server is already listening on {self.address}')
+        # A stale socket from a previous run would make the bind fail
+        Path(self.address).unlink(missing_ok=True)
+        service = self.service
+        ModelManager.register('models', callable=lambda: service)
+        manager = ModelManager(address=self.address, authkey=self.authkey)
+        server = manager.get_server()
+        os.chmod(self.address, 0o600)
+        logger.info('Model server listening on %s', self.address)
+        try:
+            server.serve_forever()
+        finally:
+            Path(self.address).unlink(missing_ok=True)
+
+
+def connect(address: str = DEFAULT_ADDRESS, authkey: bytes = None):
+    '''
+    Connects to a running model server and returns the proxy of its models service
+    '''
+    manager = ModelManager(address=address, authkey=authkey or get_authkey(address))
+    manager.connect()
+    return manager.models()
@@ -1,68 +1,305 @@
-from talosbot.matchers.exceptions import NoMatchingSkillException
+import asyncio
+import inspect
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from threading import Thread
+from talosbot.batching import MicroBatcher
+from talosbot.cache import LRUCache
+from talosbot.matchers.exceptions import AmbiguousScoreException, NoMatchingSkillException
+from talosbot.metrics import Metrics, NullMetrics
 from talosbot import logger
 
 
 class Message(object):
-    ''' Message class with the raw message string and an optinal meta dict with any custom objects '''
-    def __init__(self, message, meta=None):
+    '''
+    Message class with the raw message string and an optinal meta dict with any custom objects,
+    the responses given when the bot timeout is reached are flagged as timed out
+    '''
+    def __init__(self, message, meta=None, timed_out=False):
         self.message = message
         self.meta = meta
+        self.timed_out = timed_out
 
 class Bot(object):
     ''' Bot main class '''
-    def __init__(self, matcher, parser, channel) -> None:
+
+    DEFAULT_TIMEOUT_MESSAGE = 'Sorry, that took too long, try it again later'
+
+    def __init__(self, matcher, parser, channel,
+                 batch_max_wait: float = None,
+                 batch_max_size: int = MicroBatcher.DEFAULT_MAX_BATCH_SIZE,
+                 executor: Executor = None,
+                 timeout: float = None,
+                 max_concurrency: int = None,
+                 timeout_message: str = DEFAULT_TIMEOUT_MESSAGE,
+                 metrics: Metrics = None,
+                 cache_size: int = None,
+                 cache_ttl: float = None) -> None:
         self.matcher = matcher
         self.parser = parser
         self.channel = channel
         self.default_match = matcher.default_match
-        self.channel.set_bot(self)
+        # Thread pool for the blocking work of the async path, None is the event loop default one.
+        # Process pools cannot work, the bot itself with its locks would be pickled for every call
+        if executor is not None and not isinstance(executor, ThreadPoolExecutor):
+            raise TypeError(f'The bot executor must be a ThreadPoolExecutor, not {type(executor).__name__}')
+        self.executor = executor
+        self.timeout = timeout
+        self.timeout_message = timeout_message
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        # Pipeline stage timers and skill counters, disabled unless a Metrics object is given
+        self.metrics = metrics or NullMetrics()
+        # Micro-batching of the async matching, disabled unless a batch window is given
+        self.batcher = None
+        if batch_max_wait is not None:
+            # Looked up on every batch, so it follows the skill reloads
+            self.batcher = MicroBatcher(lambda sentences: self.matcher.sentence_matcher_many(sentences),
+                                        batch_max_size, batch_max_wait)
+        # Matched sentence and extracted parameters per message, disabled unless a cache size is given
+        self.cache = LRUCache(cache_size, cache_ttl) if cache_size else None
+        # Bots without channel are driven by someone else, e.g. the multi-tenant router
+        if self.channel is not None:
+            self.channel.set_bot(self)
 
-    def match(self, sentence: str, patterns: str):
+    def match(self, sentence: str, patterns: str = None, **kwargs):
         '''
-        Makes accessible from the bot, the match decorator method from the matcher
+        Makes accessible from the bot, the match decorator method from the matcher,
+        extra keyword arguments (like the hybrid matcher regex) are passed through
         '''
-        if type(patterns) not in (list, tuple, dict, None):
+        if patterns is not None and type(patterns) not in (list, tuple, dict):
             msg = f'Unsupported type {type(patterns)} for patterns'
             raise Exception(msg)
-        return self.matcher.match(sentence, patterns)
+        if self.cache is not None:
+            # The cached resolutions may be outdated by the new skill
+            self.cache.clear()
+        return self.matcher.match(sentence, patterns, **kwargs)
+
+    def reload_skills(self, skills: dict) -> None:
+        '''
+        Replaces the registered skills (sentence to skill dict, with its func, patterns
+        and any matcher option), the new matcher is built aside reusing the unchanged skills
+        indexes and then swapped in, so the messages in flight keep using the previous one
+        '''
+        matcher = self.matcher.reloaded(skills)
+        self.matcher = matcher
+        self.default_match = matcher.default_match
+        if self.cache is not None:
+            self.cache.clear()
+
+    @staticmethod
+    def cache_key(sentence: str) -> str:
+        '''
+        Cache key of the message, its exact text: the matchers and parsers see every whitespace,
+        so messages differing only in them may resolve to other skills or parameters
+        '''
+        return sentence
+
+    def cached_skill(self, sentence: str) -> tuple | None:
+        '''
+        Returns the skill function and its parameters already resolved for the same message, if any
+        '''
+        if self.cache is None:
+            return None
+        resolution = self.cache.get(self.cache_key(sentence))
+        if resolution is None:
+            self.metrics.increment('cache_misses')
+            return None
+        self.metrics.increment('cache_hits')
+        matched_sentence, extracted_patterns = resolution
+        matcher = self.matcher
+        if matched_sentence is None:
+            self.metrics.increment('default')
+            return matcher.default_skill, {}
+        skill = matcher.available_skills.get(matched_sentence)
+        if skill is None:
+            # Resolved before the skills were reloaded
+            return None
+        self.metrics.increment('hits', matched_sentence)
+        return skill['func'], dict(extracted_patterns)
+
+    def _cache_resolution(self, sentence: str, matched_sentence: str | None, extracted_patterns: dict) -> None:
+        if self.cache is not None:
+            self.cache.put(self.cache_key(sentence), (matched_sentence, dict(extracted_patterns)))
     
-    def execute_skill(self, sentence: str) -> str:
+    def resolve_skill(self, sentence: str, matched_sentence: str | Exception = None,
+                      parameters: dict | Exception = None) -> tuple:
         '''
-        Gets a sentence, then the matching and params extraction (if any) is executed,
-        at last, the result obtained from the skill is returned
+        Gets a sentence, then the matching (unless the matched sentence, or the exception raised
+        while matching, is given) and params extraction (unless the parameters, or the exception
+        raised while extracting them, are given) is executed,
+        at last, the skill function and its parameters are returned.
+        The resolution is cached (when the cache is enabled) for the same message,
+        including the messages without any matching skill
         '''
-        skill_function = self.matcher.default_skill
+        # The same matcher all along, even if the skills are reloaded meanwhile
+        matcher = self.matcher
+        skill_function = matcher.default_skill
         skill_patterns = dict()
         extracted_patterns = dict()
+        matched = False
         try:
-            matched_sentence = self.matcher.sentence_matcher(sentence)
-            skill_function = self.matcher.available_skills[matched_sentence]['func']
-            skill_patterns = self.matcher.available_skills[matched_sentence]['patterns']
-            extracted_patterns = self.parser.extract_parameters(sentence=sentence, extraction_patterns=skill_patterns)
+            if matched_sentence is None:
+                with self.metrics.timer('match'):
+                    matched_sentence = matcher.sentence_matcher(sentence)
+            elif isinstance(matched_sentence, Exception):
+                raise matched_sentence
+            skill_function = matcher.available_skills[matched_sentence]['func']
+            matched = True
+            # Labelled by the sentence, unique per skill, partials and callable objects have no name
+            self.metrics.increment('hits', matched_sentence)
+            skill_patterns = matcher.available_skills[matched_sentence]['patterns']
+            if isinstance(parameters, Exception):
+                raise parameters
+            if parameters is not None:
+                extracted_patterns = parameters
+            else:
+                with self.metrics.timer('extract'):
+                    extracted_patterns = self.parser.extract_parameters(sentence=sentence, extraction_patterns=skill_patterns)
+            self._cache_resolution(sentence, matched_sentence, extracted_patterns)
         except NoMatchingSkillException as e:
-            msg = f'Cannot match any sentence, getting the default one\n{e}'
-            logger.warning(msg)
+            self.metrics.increment('misses')
+            self._cache_resolution(sentence, None, {})
+            logger.warning('Cannot match any sentence, getting the default one\n%s', e)
+        except AmbiguousScoreException as e:
+            self.metrics.increment('ambiguous')
+            self._cache_resolution(sentence, None, {})
+            logger.warning('Ambiguous match, getting the default one\n%s', e)
         finally:
-            logger.debug(f'Extracted parameters: {extracted_patterns}')
+            if not matched:
+                self.metrics.increment('default')
+            logger.debug('Extracted parameters: %s', extracted_patterns)
+            return skill_function, extracted_patterns
+
+    def resolve_skills(self, sentences: list) -> list[tuple]:
+        '''
+        Batch version of resolve skill, the messages not cached are matched
+        with a single matcher call and their parameters extracted with a single parser call
+        '''
+        resolutions = [self.cached_skill(sentence) for sentence in sentences]
+        pending = [ith for ith, resolution in enumerate(resolutions) if resolution is None]
+        if not pending:
+            return resolutions
+        pending_sentences = [sentences[ith] for ith in pending]
+        matcher = self.matcher
+        with self.metrics.timer('match'):
+            matched_sentences = matcher.sentence_matcher_many(pending_sentences)
+        # Only the matched skills with extraction patterns go to the parser
+        extractions = [position for position, matched_sentence in enumerate(matched_sentences)
+                       if not isinstance(matched_sentence, Exception)
+                       and 'patterns' in matcher.available_skills.get(matched_sentence, {})]
+        parameters = [None] * len(pending)
+        if extractions:
+            with self.metrics.timer('extract'):
+                extracted = self.parser.extract_parameters_many(
+                    [pending_sentences[position] for position in extractions],
+                    [matcher.available_skills[matched_sentences[position]]['patterns'] for position in extractions])
+            for position, result in zip(extractions, extracted):
+                parameters[position] = result
+        for position, ith in enumerate(pending):
+            resolutions[ith] = self.resolve_skill(pending_sentences[position], matched_sentences[position], parameters[position])
+        return resolutions
+
+    def execute_skill(self, sentence: str) -> str:
+        '''
+        Gets a sentence, then the matching and params extraction (if any) is executed,
+        at last, the result obtained from the skill is returned
+        '''
+        skill_function, extracted_patterns = self.cached_skill(sentence) or self.resolve_skill(sentence)
+        with self.metrics.timer('skill'):
             result = skill_function(**extracted_patterns)
-            return result
+        if inspect.iscoroutine(result):
+            # Coroutine skills out of an event loop, e.g. from the CLI channel
+            result = asyncio.run(result)
+        return result
     
     async def async_execute_skill(self, sentence: str) -> str:
         '''
         Async version of execute skill method,
-        use it when you are using a library that implements coroutines
+        use it when you are using a library that implements coroutines.
+        The matching, the extraction and the sync skills run in the executor,
+        so the event loop keeps serving other messages meanwhile
+        '''
+        loop = asyncio.get_running_loop()
+        resolution = self.cached_skill(sentence)
+        if resolution is None:
+            matched_sentence = None
+            if self.batcher is not None:
+                with self.metrics.timer('match'):
+                    try:
+                        matched_sentence = await self.batcher.submit(sentence)
+                    except Exception as e:
+                        matched_sentence = e
+            resolution = await loop.run_in_executor(self.executor, self.resolve_skill, sentence, matched_sentence)
+        return await self.async_run_skill(*resolution)
+
+    async def async_run_skill(self, skill_function, extracted_patterns: dict) -> str:
         '''
-        return self.execute_skill(sentence)
+        Runs the resolved skill, awaiting the coroutine skills and the sync ones in the executor
+        '''
+        loop = asyncio.get_running_loop()
+        with self.metrics.timer('skill'):
+            if inspect.iscoroutinefunction(skill_function):
+                return await skill_function(**extracted_patterns)
+            result = await loop.run_in_executor(self.executor, partial(skill_function, **extracted_patterns))
+            if inspect.iscoroutine(result):
+                result = await result
+        return result
 
     async def async_message_handler(self, user_message: Message) -> Message:
         '''
-        Async version for the message handler method
+        Async version for the message handler method, limited by the bot
+        concurrency and timeout settings (if any)
         '''
         sentence = user_message.message
-        result_message = await self.async_execute_skill(sentence)
-        result = Message(result_message, user_message.meta)
+        timed_out = False
+        async with self.semaphore or nullcontext():
+            try:
+                result_message = await asyncio.wait_for(self.async_execute_skill(sentence), self.timeout)
+            except asyncio.TimeoutError:
+                # Work already running in the executor cannot be interrupted, only its result is dropped
+                logger.warning('Timeout of %ss reached processing message: %s', self.timeout, sentence)
+                result_message = self.timeout_message
+                timed_out = True
+        result = Message(result_message, user_message.meta, timed_out)
         return result
     
+    async def async_message_handler_many(self, user_messages: list) -> list[Message]:
+        '''
+        Batch version of the async message handler, the messages are resolved together
+        and their skills run one after the other, keeping the messages order.
+        The timeout applies to every skill run, the shared matching and extraction
+        of the batch is not counted in it. A failing skill only gets its own message
+        answered by the default skill
+        '''
+        loop = asyncio.get_running_loop()
+        sentences = [user_message.message for user_message in user_messages]
+        results = []
+        async with self.semaphore or nullcontext():
+            resolutions = await loop.run_in_executor(self.executor, self.resolve_skills, sentences)
+            for sentence, user_message, resolution in zip(sentences, user_messages, resolutions):
+                timed_out = False
+                try:
+                    result_message = await asyncio.wait_for(self.async_run_skill(*resolution), self.timeout)
+                except asyncio.TimeoutError:
+                    logger.warning('Timeout of %ss reached processing message: %s', self.timeout, sentence)
+                    result_message = self.timeout_message
+                    timed_out = True
+                except Exception:
+                    logger.exception('Error running the skill of message: %s', sentence)
+                    self.metrics.increment('errors')
+                    results.append(await self.default_response(user_message))
+                    continue
+                results.append(Message(result_message, user_message.meta, timed_out))
+        return results
+
+    async def default_response(self, user_message: Message) -> Message:
+        '''
+        Answers the message with the default skill, used for the messages whose processing failed
+        '''
+        result_message = await self.async_run_skill(self.matcher.default_skill, {})
+        return Message(result_message, user_message.meta)
+
     def message_handler(self, user_message: Message) -> Message:
         '''
         Gets a message, passes the raw string to the execute skill method and
@@ -73,8 +310,22 @@ class Bot(object):
         result = Message(result_message, user_message.meta)
         return result
 
+    def warm_up(self) -> None:
+        '''
+        Builds the skills indexes in a background thread, so the channel connects meanwhile
+        and the first messages only wait for what is left of it
+        '''
+        def warm_up():
+            try:
+                self.matcher.warm_up()
+            except Exception:
+                # Raised again to the messages, which build what is missing
+                logger.exception('Cannot warm up the matcher')
+        Thread(target=warm_up, name='talos-warmup-matcher', daemon=True).start()
+
     def run(self) -> None:
         '''
         Main module execution
         '''
+        self.warm_up()
         self.channel.establish()
@@ -0,0 +1,101 @@
+import os
+import threading
+from collections import deque
+from functools import partial
+from typing import Callable, Hashable
+
+from talosbot import logger
+
+
+class FairWorkerPool(object):
+    '''
+    Bounded pool of worker threads, the tasks are queued per key (e.g. the user) and the keys
+    take turns, so a user flooding the bot only delays its own messages.
+    The tasks of the same key run one at a time in submission order, and a new task is rejected
+    when the pool or its key queue is full, so the caller can tell the user to retry later
+    '''
+
+    DEFAULT_MAX_PENDING = 256
+    DEFAULT_MAX_PENDING_PER_KEY = 8
+
+    def __init__(self, workers: int = None,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 max_pending_per_key: int = DEFAULT_MAX_PENDING_PER_KEY,
+                 name: str = 'talos-worker') -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.max_pending_per_key = max_pending_per_key
+        self.name = name
+        # Queued tasks per key, a key stays here while it has a task running
+        self._queues = {}
+        # Keys with queued tasks and none running, in turn order
+        self._ready = deque()
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        self._running = False
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def start(self) -> None:
+        '''
+        Starts the worker threads
+        '''
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [threading.Thread(target=self._work, name=f'{self.name}-{ith}', daemon=True)
+                         for ith in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        '''
+        Stops the workers once the queued tasks are done
+        '''
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def submit(self, key: Hashable, function: Callable, *args, **kwargs) -> bool:
+        '''
+        Queues the task under its key, it returns False when it's rejected by the backpressure limits
+        '''
+        with self._condition:
+            queue = self._queues.get(key)
+            if self._pending >= self.max_pending or (queue is not None and len(queue) >= self.max_pending_per_key):
+                return False
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._ready.append(key)
+            queue.append(partial(function, *args, **kwargs))
+            self._pending += 1
+            self._condition.notify()
+        return True
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while self._running and not self._ready:
+                    self._condition.wait()
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                task = self._queues[key].popleft()
+            try:
+                task()
+            except Exception:
+                logger.exception('Task of %s failed', key)
+            with self._condition:
+                self._pending -= 1
+                if self._queues[key]:
+                    # Back to the end of the turn
+                    self._ready.append(key)
+                    self._condition.notify()
+                else:
+                    del self._queues[key]
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from talosbot.batching import BatchingEncoder
+
+
+class RecordingModel(object):
+    ''' Encoder returning the length of every sentence and recording its calls '''
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def encode(self, sentences, **kwargs):
+        self.calls.append((list(sentences), kwargs))
+        return [[len(sentence)] for sentence in sentences]
+
+
+def test_lone_caller_does_not_wait_for_the_window():
+    encoder = BatchingEncoder(RecordingModel(), max_wait=10)
+    started = time.monotonic()
+    assert encoder.encode(['abc', 'de']).tolist() == [[3], [2]]
+    assert time.monotonic() - started < 1
+
+
+def test_calls_are_only_merged_with_the_same_options():
+    model = RecordingModel()
+    encoder = BatchingEncoder(model, max_wait=.05)
+    barrier = threading.Barrier(6)
+    results = {}
+
+    def encode(sentence, **kwargs):
+        barrier.wait()
+        results[sentence] = encoder.encode([sentence], **kwargs).tolist()
+
+    threads = [threading.Thread(target=encode, args=(f'{"x" * ith}',), kwargs={'normalize': True} if ith % 2 else {})
+               for ith in range(1, 7)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {'x' * ith: [[ith]] for ith in range(1, 7)}
+    for sentences, kwargs in model.calls:
+        assert kwargs == ({'normalize': True} if len(sentences[0]) % 2 else {})
+        assert {len(sentence) % 2 for sentence in sentences} == {len(sentences[0]) % 2}
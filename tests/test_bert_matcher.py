@@ -0,0 +1,83 @@
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from talosbot.matchers.bert import BertMatcher
+from talosbot.matchers.indexes import ExactIndex
+from talosbot.matchers.text import tokenize
+
+
+class HashingEncoder(object):
+    ''' Slow bag of words encoder, every word is hashed into its own dimension '''
+
+    def __init__(self, delay: float = .0) -> None:
+        self.delay = delay
+        self.calls = []
+
+    def encode(self, sentences):
+        self.calls.append(list(sentences))
+        time.sleep(self.delay)
+        embeddings = np.zeros((len(sentences), 4096))
+        for row, sentence in enumerate(sentences):
+            for token in tokenize(sentence):
+                embeddings[row, zlib.crc32(token.encode()) % 4096] += 1
+        return embeddings
+
+
+def make_matcher(sentences, **kwargs):
+    matcher = BertMatcher(encoder=HashingEncoder(**kwargs), acceptance_threshold=.5)
+    for sentence in sentences:
+        matcher.match(sentence)(lambda: None)
+    return matcher
+
+
+def test_concurrent_first_messages_wait_for_the_index():
+    sentences = [f'skill number {ith} word{ith}' for ith in range(50)]
+    matcher = make_matcher(sentences, delay=.2)
+    with ThreadPoolExecutor(20) as executor:
+        results = list(executor.map(matcher.sentence_matcher, sentences[:20]))
+    assert results == sentences[:20]
+    # The catalogue is encoded once
+    assert len([call for call in matcher.model.calls if len(call) == 50]) == 1
+
+
+def test_warm_up_builds_the_index_before_the_first_message():
+    matcher = make_matcher(['restart the web server', 'show the cluster status'])
+    matcher.warm_up()
+    assert len(matcher.index) == 2
+    assert matcher.sentence_matcher('show the cluster status now') == 'show the cluster status'
+    assert matcher.model.calls[-1] == ['show the cluster status now']
+
+
+def test_skills_registered_while_serving_are_swapped_in():
+    matcher = make_matcher(['restart the web server'])
+    matcher.warm_up()
+    index = matcher.index
+    matcher.match('deploy the new release')(lambda: None)
+    assert matcher.sentence_matcher('deploy the new release') == 'deploy the new release'
+    # The index searched meanwhile was left untouched
+    assert len(index) == 1
+    assert len(matcher.index) == 2
+
+
+def test_index_stores_the_vectors_before_the_keys():
+    index = ExactIndex()
+    seen = []
+    original = index.add_vectors
+    def add_vectors(vectors):
+        seen.append(list(index.keys))
+        original(vectors)
+    index.add_vectors = add_vectors
+    index.add(['a', 'b', 'a'], np.eye(3))
+    assert seen == [[]]
+    assert index.keys == ['a', 'b']
+
+
+def test_embedding_cache_of_an_injected_encoder_requires_its_model(tmp_path):
+    with pytest.raises(ValueError):
+        BertMatcher(encoder=HashingEncoder(), cache_dir=tmp_path)
+    matcher = BertMatcher(encoder=HashingEncoder(), model='hashing', cache_dir=tmp_path)
+    assert matcher.embedding_cache.model_name == 'hashing'
@@ -0,0 +1,97 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from talosbot.matchers.regex import RegexMatcher
+from talosbot.metrics import Metrics
+from talosbot.parsers.regex import RegexParser
+from talosbot.talos import Bot, Message
+
+
+def make_bot(**kwargs):
+    bot = Bot(RegexMatcher(), RegexParser(), None, metrics=Metrics(), **kwargs)
+
+    @bot.match(r'deploy \w+$', {'SERVICE': r'deploy (\w+)'})
+    def deploy(SERVICE):
+        return f'deploying {SERVICE}'
+
+    @bot.match(r'say ', {'TEXT': r'say (.*)'})
+    def say(TEXT):
+        return f'[{TEXT}]'
+
+    return bot
+
+
+def ask(bot, sentence):
+    return bot.message_handler(Message(sentence)).message
+
+
+def test_cached_resolution_gives_the_same_answer():
+    bot = make_bot(cache_size=16)
+    assert ask(bot, 'deploy web') == 'deploying web'
+    assert ask(bot, 'deploy web') == 'deploying web'
+    counters = bot.metrics.snapshot()['counters']
+    assert counters['cache_hits'] == 1
+    assert counters['cache_misses'] == 1
+    assert counters['hits'] == {r'deploy \w+$': 2}
+
+
+def test_cached_miss_is_not_served_for_other_spacing():
+    bot = make_bot(cache_size=16)
+    assert ask(bot, 'deploy  web') == 'I have no skill for that, sorry!'
+    assert ask(bot, 'deploy web') == 'deploying web'
+
+
+def test_cached_parameters_keep_the_spacing_of_every_message():
+    bot = make_bot(cache_size=16)
+    assert ask(bot, 'say hello  world') == '[hello  world]'
+    assert ask(bot, 'say hello world') == '[hello world]'
+    assert ask(bot, 'say hello  world') == '[hello  world]'
+
+
+def test_new_skills_clear_the_cache():
+    bot = make_bot(cache_size=16)
+    assert ask(bot, 'status') == 'I have no skill for that, sorry!'
+
+    @bot.match(r'status')
+    def status():
+        return 'all good'
+
+    assert ask(bot, 'status') == 'all good'
+
+
+def test_cache_disabled_by_default():
+    bot = make_bot()
+    assert bot.cache is None
+    assert ask(bot, 'deploy web') == 'deploying web'
+
+
+def test_a_failing_skill_only_affects_its_own_message_in_a_batch():
+    bot = make_bot()
+    deployed = []
+
+    @bot.match(r'release \w+$', {'SERVICE': r'release (\w+)'})
+    def release(SERVICE):
+        deployed.append(SERVICE)
+        return f'released {SERVICE}'
+
+    @bot.match(r'crash')
+    def crash():
+        raise RuntimeError('boom')
+
+    messages = [Message(sentence, {'position': ith})
+                for ith, sentence in enumerate(['release web', 'crash', 'release api'])]
+    responses = asyncio.run(bot.async_message_handler_many(messages))
+    assert [response.message for response in responses] == ['released web', 'I have no skill for that, sorry!', 'released api']
+    assert [response.meta['position'] for response in responses] == [0, 1, 2]
+    assert deployed == ['web', 'api']
+    assert bot.metrics.snapshot()['counters']['errors'] == 1
+
+
+def test_process_pools_are_rejected():
+    with ProcessPoolExecutor(1) as executor:
+        with pytest.raises(TypeError):
+            make_bot(executor=executor)
+    with ThreadPoolExecutor(1) as executor:
+        assert make_bot(executor=executor).executor is executor
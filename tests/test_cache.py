@@ -0,0 +1,63 @@
+import pytest
+
+from talosbot import cache as cache_module
+from talosbot.cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_evicts_the_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_zero_size_disables_it():
+    cache = LRUCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a', 'missing') == 'missing'
+
+
+def test_values_expire_after_the_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.put('a', 1)
+    clock[0] += 9.9
+    assert cache.get('a') == 1
+    clock[0] += .1
+    assert cache.get('a', 'expired') == 'expired'
+    assert len(cache) == 0
+
+
+def test_reading_does_not_extend_the_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.put('a', 1)
+    clock[0] += 6
+    assert cache.get('a') == 1
+    clock[0] += 6
+    assert cache.get('a') is None
+
+
+def test_putting_again_restarts_the_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.put('a', 1)
+    clock[0] += 6
+    cache.put('a', 2)
+    clock[0] += 6
+    assert cache.get('a') == 2
+
+
+def test_no_ttl_never_expires(clock):
+    cache = LRUCache()
+    cache.put('a', 1)
+    clock[0] += 1e9
+    assert cache.get('a') == 1
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from talosbot.matchers.abstract_matcher import AbstractMatcher
+from talosbot.matchers.exceptions import NoMatchingSkillException
+from talosbot.matchers.hybrid import HybridMatcher
+
+
+class RecordingMatcher(AbstractMatcher):
+    ''' Semantic matcher answering the first shortlisted skill and recording its calls '''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = []
+
+    def sentence_matcher(self, input_sentence, shortlist=None):
+        self.calls.append((input_sentence, shortlist))
+        if not self.available_skills:
+            raise NoMatchingSkillException
+        return shortlist[0] if shortlist else next(iter(self.available_skills))
+
+
+def make_matcher(*sentences, **kwargs):
+    matcher = HybridMatcher(semantic_matcher=RecordingMatcher(), **kwargs)
+    for sentence in sentences:
+        matcher.match(sentence)(lambda: sentence)
+    return matcher
+
+
+def test_exact_stage():
+    matcher = make_matcher('deploy the app', 'show job status')
+    assert matcher.lexical_matcher('  Deploy the APP! ') == ('exact', 'deploy the app')
+
+
+def test_regex_stage_runs_before_keywords():
+    matcher = make_matcher('show job status')
+    matcher.match('restart service', regex=r'^reboot \w+$')(lambda: None)
+    assert matcher.lexical_matcher('reboot web') == ('regex', 'restart service')
+
+
+def test_keyword_stage_needs_every_skill_word():
+    matcher = make_matcher('deploy the app', 'show job status')
+    assert matcher.lexical_matcher('show me the job status') == ('keyword', 'show job status')
+    stage, shortlist = matcher.lexical_matcher('show me the app')
+    assert stage == 'shortlist'
+    assert set(shortlist) == {'deploy the app', 'show job status'}
+
+
+def test_keyword_stage_rejects_ties():
+    matcher = make_matcher('job status', 'deploy now')
+    assert matcher.lexical_matcher('job status now') == ('keyword', 'job status')
+    matcher = make_matcher('job status', 'status of job')
+    stage, _ = matcher.lexical_matcher('job status of job')
+    assert stage == 'shortlist'
+
+
+def test_keyword_full_match_scores_exactly_one():
+    matcher = make_matcher('job status please deploy', 'run the tests', 'restart pipeline now')
+    scores = dict(matcher.keyword_scores('job status please deploy now tests pipeline'))
+    assert scores['job status please deploy'] == 1.
+    assert matcher.lexical_matcher('job status please deploy now tests pipeline') == ('keyword', 'job status please deploy')
+
+
+def test_keyword_full_match_reaches_threshold_on_random_catalogues():
+    words = ['job', 'status', 'please', 'deploy', 'now', 'tests', 'pipeline', 'restart', 'show', 'logs', 'app', 'run']
+    rng = random.Random(0)
+    for _ in range(500):
+        sentences = {' '.join(rng.sample(words, rng.randint(1, 5))) for _ in range(6)}
+        matcher = make_matcher(*sentences)
+        for sentence in sentences:
+            extra = rng.sample(words, 3)
+            scores = dict(matcher.keyword_scores(' '.join(sentence.split() + extra)))
+            assert scores[sentence] == 1.
+
+
+def test_keyword_stage_needs_the_skill_words_to_cover_the_message():
+    matcher = make_matcher('stop', 'restart the server', 'show job status')
+    stage, shortlist = matcher.lexical_matcher('show me why the server did not stop yesterday')
+    assert stage == 'shortlist'
+    assert set(shortlist) == {'stop', 'restart the server', 'show job status'}
+    assert matcher.lexical_matcher('stop it') == ('keyword', 'stop')
+    matcher = make_matcher('stop', 'show job status', keyword_coverage=0.)
+    assert matcher.lexical_matcher('show me why the server did not stop yesterday') == ('keyword', 'stop')
+
+
+def test_keyword_threshold_none_disables_the_stage():
+    matcher = make_matcher('deploy the app', 'show job status', keyword_threshold=None)
+    stage, _ = matcher.lexical_matcher('please show job status')
+    assert stage == 'shortlist'
+
+
+def test_semantic_matcher_only_scores_the_shortlist():
+    matcher = make_matcher('deploy the app', 'show job status', 'restart pipeline')
+    assert matcher.sentence_matcher('show me the app') in ('deploy the app', 'show job status')
+    assert matcher.semantic_matcher.calls[-1][1] is not None
+    assert 'restart pipeline' not in matcher.semantic_matcher.calls[-1][1]
+    matcher.sentence_matcher('hello there')
+    assert matcher.semantic_matcher.calls[-1] == ('hello there', None)
+    assert matcher.stats == {'shortlist': 1, 'semantic': 1}
+
+
+def test_batch_only_sends_the_residual_messages():
+    class BatchRecordingMatcher(RecordingMatcher):
+        def sentence_matcher_many(self, input_sentences, shortlists=None):
+            self.calls.append(('many', list(input_sentences)))
+            return [self.sentence_matcher(sentence, shortlist) for sentence, shortlist in zip(input_sentences, shortlists)]
+
+    matcher = HybridMatcher(semantic_matcher=BatchRecordingMatcher())
+    for sentence in ('deploy the app', 'show job status'):
+        matcher.match(sentence)(lambda: None)
+    results = matcher.sentence_matcher_many(['deploy the app', 'show me the app'])
+    assert results[0] == 'deploy the app'
+    assert matcher.semantic_matcher.calls[0] == ('many', ['show me the app'])
+
+
+def test_no_skills_raises():
+    matcher = make_matcher()
+    with pytest.raises(NoMatchingSkillException):
+        matcher.sentence_matcher('anything')
@@ -0,0 +1,75 @@
+import re
+
+import pytest
+
+from talosbot.matchers.exceptions import NoMatchingSkillException
+from talosbot.matchers.regex import RegexMatcher
+
+
+def make_matcher(*sentences):
+    matcher = RegexMatcher()
+    for sentence in sentences:
+        matcher.match(sentence)(lambda: None)
+    return matcher
+
+
+def test_combinable_patterns_share_one_alternation():
+    matcher = make_matcher(r'deploy (\w+) to (\w+)', r'restart (\w+)', r'status')
+    engine = matcher.build_engine()
+    assert len(engine) == 1
+    compiled, groups = engine[0]
+    # Every outer group skips the inner groups of the previous alternatives
+    assert groups == {1: r'deploy (\w+) to (\w+)', 4: r'restart (\w+)', 6: 'status'}
+    assert compiled.groups == 6
+
+
+@pytest.mark.parametrize('standalone', [
+    r'greet (?P<name>\w+)',
+    r'say (\w+) \1',
+    r'(a)?(?(1)b|c)',
+])
+def test_named_groups_and_backreferences_are_kept_alone(standalone):
+    matcher = make_matcher(r'first (\w+)', standalone, r'last (\w+)')
+    engine = matcher.build_engine()
+    assert [groups for _, groups in engine] == [{1: r'first (\w+)'}, {None: standalone}, {1: r'last (\w+)'}]
+
+
+def test_flagged_patterns_are_kept_alone():
+    matcher = RegexMatcher()
+    matcher.match(r'alpha')(lambda: None)
+    matcher.compiled_patterns[r'beta'] = re.compile(r'beta', re.IGNORECASE)
+    matcher.match(r'beta')(lambda: None)
+    matcher.match(r'(?i)gamma')(lambda: None)
+    engine = matcher.build_engine()
+    assert [groups for _, groups in engine] == [{1: 'alpha'}, {None: 'beta'}, {None: '(?i)gamma'}]
+    assert matcher.sentence_matcher('BETA') == 'beta'
+    assert matcher.sentence_matcher('GAMMA') == '(?i)gamma'
+
+
+def test_first_registered_skill_wins():
+    matcher = make_matcher(r'show (\w+)', r'say (\w+) \1', r'show logs', r'(\w+) (\w+)')
+    assert matcher.sentence_matcher('show logs') == r'show (\w+)'
+    assert matcher.sentence_matcher('say hi hi') == r'say (\w+) \1'
+    assert matcher.sentence_matcher('say hi ho') == r'(\w+) (\w+)'
+
+
+def test_same_results_as_matching_every_pattern():
+    sentences = [r'deploy (\w+)( now)?', r'greet (?P<name>\w+)', r'(?i)status', r'run (\w+) (\w+)?',
+                 r'echo (\w+) \1', r'stop', r'(deploy|run) all']
+    matcher = make_matcher(*sentences)
+    inputs = ['deploy web now', 'deploy all', 'greet bob', 'STATUS', 'run a b', 'run all', 'echo x x', 'echo x y',
+              'stop', 'stopping', 'unknown']
+    for input_sentence in inputs:
+        expected = matcher.match_sentences(sentences, input_sentence)
+        if expected:
+            assert matcher.sentence_matcher(input_sentence) == expected[0]
+        else:
+            with pytest.raises(NoMatchingSkillException):
+                matcher.sentence_matcher(input_sentence)
+
+
+def test_engine_is_rebuilt_after_new_skills():
+    matcher = make_matcher(r'status')
+    assert matcher.sentence_matcher('status') == 'status'
+    matcher.match(r'restart (\w+)')(lambda: None)
+    assert matcher.sentence_matcher('restart web') == r'restart (\w+)'
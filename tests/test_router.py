@@ -0,0 +1,36 @@
+import asyncio
+
+from talosbot.matchers.regex import RegexMatcher
+from talosbot.parsers.regex import RegexParser
+from talosbot.router import BotRouter
+from talosbot.talos import Message
+
+
+class NullChannel(object):
+
+    def set_bot(self, bot):
+        self.bot = bot
+
+
+def make_router():
+    router = BotRouter(NullChannel(), parser=RegexParser())
+    ops = router.add_tenant('ops', RegexMatcher())
+
+    @ops.default_match()
+    def no_skill():
+        return 'ops has no skill for that'
+
+    return router
+
+
+def test_default_response_uses_the_tenant_default_skill():
+    router = make_router()
+    response = asyncio.run(router.default_response(Message('ops deploy web', {'chat': 1})))
+    assert response.message == 'ops has no skill for that'
+    assert response.meta == {'chat': 1}
+
+
+def test_default_response_of_an_unknown_tenant():
+    router = make_router()
+    response = asyncio.run(router.default_response(Message('dev deploy web')))
+    assert response.message == 'Unknown bot, try one of: ops'
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from talosbot.workers import FairWorkerPool
+
+
+def test_keys_take_turns():
+    pool = FairWorkerPool(workers=1, max_pending_per_key=16)
+    order = []
+    for ith in range(4):
+        pool.submit('flood', order.append, f'flood{ith}')
+    pool.submit('alice', order.append, 'alice0')
+    pool.submit('bob', order.append, 'bob0')
+    pool.submit('alice', order.append, 'alice1')
+    pool.start()
+    pool.stop()
+    assert order == ['flood0', 'alice0', 'bob0', 'flood1', 'alice1', 'flood2', 'flood3']
+
+
+def test_tasks_of_a_key_run_one_at_a_time_in_order():
+    pool = FairWorkerPool(workers=4)
+    running = []
+    overlaps = []
+    order = []
+    def task(ith):
+        running.append(ith)
+        overlaps.append(len(running))
+        time.sleep(.01)
+        order.append(ith)
+        running.remove(ith)
+    pool.start()
+    for ith in range(6):
+        assert pool.submit('alice', task, ith)
+    pool.stop()
+    assert order == list(range(6))
+    assert max(overlaps) == 1
+
+
+def test_rejects_when_the_key_queue_is_full():
+    pool = FairWorkerPool(workers=1, max_pending_per_key=2)
+    assert pool.submit('alice', lambda: None)
+    assert pool.submit('alice', lambda: None)
+    assert not pool.submit('alice', lambda: None)
+    assert pool.submit('bob', lambda: None)
+    assert len(pool) == 3
+
+
+def test_rejects_when_the_pool_is_full():
+    pool = FairWorkerPool(workers=1, max_pending=2)
+    assert pool.submit('alice', lambda: None)
+    assert pool.submit('bob', lambda: None)
+    assert not pool.submit('carol', lambda: None)
+
+
+def test_accepts_again_once_the_tasks_are_done():
+    pool = FairWorkerPool(workers=1, max_pending=1)
+    release = threading.Event()
+    pool.start()
+    assert pool.submit('alice', release.wait)
+    assert not pool.submit('bob', lambda: None)
+    release.set()
+    pool.stop()
+    assert len(pool) == 0
+    assert pool.submit('bob', lambda: None)
+
+
+def test_a_failing_task_does_not_stop_the_key():
+    pool = FairWorkerPool(workers=1)
+    done = []
+    pool.submit('alice', lambda: 1 / 0)
+    pool.submit('alice', done.append, 'next')
+    pool.start()
+    pool.stop()
+    assert done == ['next']